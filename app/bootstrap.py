@@ -0,0 +1,85 @@
+"""One-shot deployment bootstrap: migrate the schema and seed required rows.
+
+Run once per deploy, before starting the workers:
+
+    python -m app.bootstrap
+
+Concurrent runs (e.g. one per host) serialize on a Postgres advisory lock; the
+ones that get the lock second find nothing left to do.
+"""
+import argparse
+import contextlib
+from sqlalchemy import text
+from app import config, crud, database, schemas
+
+DEFAULT_RESOURCES = [
+    "create_post",
+    "comment_post",
+    "manage_post",
+    "creating_event",
+    "creating_poll",
+    "reaction_post",
+]
+
+# Arbitrary but fixed: every bootstrap process must use the same key.
+ADVISORY_LOCK_KEY = 0x52424143
+
+
+@contextlib.contextmanager
+def advisory_lock(engine):
+    if engine.dialect.name != "postgresql":
+        # SQLite serializes writers itself, and is single-host anyway.
+        yield
+        return
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        connection.commit()
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            connection.commit()
+
+
+def seed(db):
+    # One multi-row INSERT ... ON CONFLICT DO NOTHING for all default resources.
+    crud.resolve_resources(db, DEFAULT_RESOURCES)
+    db.commit()
+    print("Default resources created successfully.")
+
+    if not crud.get_user_by_email(db, config.SUPERADMIN_EMAIL):
+        crud.create_user(
+            db,
+            schemas.UserCreate(
+                name="Super Admin",
+                email=config.SUPERADMIN_EMAIL,
+                password=config.SUPERADMIN_PASSWORD,
+                role="superadmin"
+            ),
+            role="superadmin"
+        )
+        print("Superadmin created successfully.")
+
+
+def bootstrap(migrate: bool = True, seed_data: bool = True):
+    with advisory_lock(database.engine):
+        if migrate:
+            database.upgrade_schema()
+        if seed_data:
+            db = database.SessionLocal()
+            try:
+                seed(db)
+            finally:
+                db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skip-migrations", action="store_true", help="Only seed; assume the schema is current.")
+    parser.add_argument("--skip-seed", action="store_true", help="Only run the migrations.")
+    args = parser.parse_args(argv)
+    bootstrap(migrate=not args.skip_migrations, seed_data=not args.skip_seed)
+
+
+if __name__ == "__main__":
+    main()
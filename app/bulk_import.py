@@ -0,0 +1,151 @@
+import asyncio
+import csv
+import json
+import time
+from pydantic import ValidationError
+from app import config, crud, schemas, utils
+from app.dependencies import run_db
+from app.password_pool import password_pool, PasswordPoolFull
+
+
+async def iter_lines(chunks):
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def iter_records(chunks, content_type: str):
+    # Yields (row_number, record, error) one line at a time so an upload of any
+    # size is never held in memory. CSV rows must not contain embedded newlines.
+    is_csv = "csv" in (content_type or "")
+    header = None
+    row_number = 0
+    async for raw in iter_lines(chunks):
+        line = raw.decode("utf-8-sig").strip()
+        if not line:
+            continue
+        if is_csv and header is None:
+            header = [name.strip() for name in next(csv.reader([line]))]
+            continue
+        row_number += 1
+        try:
+            if is_csv:
+                record = dict(zip(header, next(csv.reader([line]))))
+            else:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+        except ValueError as exc:
+            yield row_number, None, f"Unparseable row: {exc}"
+            continue
+        yield row_number, record, None
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def fail(self, row_number: int, error: str):
+        self.errors.append({"row": row_number, "error": error})
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.started
+        processed = self.inserted + len(self.errors)
+        return {
+            "inserted": self.inserted,
+            "failed": len(self.errors),
+            "errors": sorted(self.errors, key=lambda error: error["row"]),
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(processed / elapsed, 1) if elapsed else None,
+        }
+
+
+async def _hash_with_retry(password: str):
+    # The pool is shared with logins, which may fill it at any time. Back off and
+    # retry for up to BULK_IMPORT_HASH_WAIT seconds; None means it never freed up.
+    deadline = time.monotonic() + config.BULK_IMPORT_HASH_WAIT
+    delay = 0.05
+    while True:
+        try:
+            return await utils.hash_password_queued(password)
+        except PasswordPoolFull:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, 1.0)
+
+
+async def _hash_all(passwords):
+    # Fill the password pool without exceeding its worker count, so the import
+    # does not push interactive logins into the pool's rejection path.
+    slots = asyncio.Semaphore(password_pool.workers)
+
+    async def hash_one(password):
+        async with slots:
+            return await _hash_with_retry(password)
+
+    return await asyncio.gather(*(hash_one(password) for password in passwords))
+
+
+async def _flush(db, batch, report: ImportReport, is_active: bool):
+    hashes = await _hash_all([user.password for _, user in batch])
+    hashed_batch = []
+    for (row_number, user), hashed in zip(batch, hashes):
+        if hashed is None:
+            report.fail(row_number, "Password hashing is saturated; retry this row")
+        else:
+            hashed_batch.append((row_number, user, hashed))
+    if not hashed_batch:
+        return
+    rows = [
+        {
+            "name": user.name,
+            "email": user.email,
+            "password": hashed,
+            "role": user.role,
+            "is_active": is_active,
+        }
+        for _, user, hashed in hashed_batch
+    ]
+    inserted = await run_db(db, crud.bulk_insert_users, rows)
+    for row_number, user, _ in hashed_batch:
+        if user.email in inserted:
+            report.inserted += 1
+        else:
+            report.fail(row_number, "Email already registered")
+
+
+async def import_users(db, chunks, content_type: str, is_active: bool):
+    report = ImportReport()
+    batch = []
+    seen = set()
+    async for row_number, record, error in iter_records(chunks, content_type):
+        if error:
+            report.fail(row_number, error)
+            continue
+        try:
+            user = schemas.UserCreate(**record)
+        except ValidationError as exc:
+            report.fail(row_number, "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in exc.errors()
+            ))
+            continue
+        if user.email in seen:
+            report.fail(row_number, "Duplicate email in upload")
+            continue
+        seen.add(user.email)
+        batch.append((row_number, user))
+        if len(batch) >= config.BULK_IMPORT_BATCH_SIZE:
+            await _flush(db, batch, report, is_active)
+            batch = []
+    if batch:
+        await _flush(db, batch, report, is_active)
+    return report.as_dict()
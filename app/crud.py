@@ -1,15 +1,33 @@
+import hmac
+import time
+import uuid
+from sqlalchemy import case, exists, insert, select
 from sqlalchemy.orm import Session
-from app import models, utils, schemas
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import config, models, utils, schemas
+from app.permission_cache import permission_cache, to_mask, to_permissions
+from app.invalidation import invalidation_bus
 
 
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 
+def get_permission_masks(db: Session, user_id: int):
+    rows = (
+        db.query(models.Resource.name, models.EffectivePermission.mask)
+        .join(models.EffectivePermission, models.EffectivePermission.resource_id == models.Resource.id)
+        .filter(models.EffectivePermission.user_id == user_id)
+        .all()
+    )
+    return {name: mask for name, mask in rows if mask}
+
 
 
-def create_user(db: Session, user: schemas.UserCreate, role: str, is_active: bool = True):
-    hashed_pwd = utils.hash_password(user.password)
+
+def create_user(db: Session, user: schemas.UserCreate, role: str, is_active: bool = True, hashed_password: str = None):
+    hashed_pwd = hashed_password or utils.hash_password(user.password)
     db_user = models.User(
         name=user.name,
         email=user.email,
@@ -18,91 +36,413 @@ def create_user(db: Session, user: schemas.UserCreate, role: str, is_active: boo
         is_active=is_active
     )
     db.add(db_user)
+    db.flush()
+    materialize_role_grants(db, models.User.id == db_user.id)
     db.commit()
     db.refresh(db_user)
     return db_user
 
+
+def bulk_insert_users(db: Session, rows: list):
+    # One multi-row INSERT per batch; rows whose email already exists are skipped
+    # and left out of the returned set so the caller can report them.
+    if not rows:
+        return set()
+    stmt = (
+        dialect_insert(db, models.User)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["email"])
+        .returning(models.User.email)
+    )
+    inserted = set(db.execute(stmt).scalars().all())
+    if inserted:
+        materialize_role_grants(db, models.User.email.in_(inserted))
+    db.commit()
+    return inserted
+
+
+def update_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(models.User).filter(models.User.id == user_id).update({"password": hashed_password})
+    db.commit()
+
+
+def get_permission_version(db: Session, user_id: int):
+    # (roles.perm_version, users.perm_version); a role without a template row is 0.
+    user_version, role_version = (
+        db.query(models.User.perm_version, models.Role.perm_version)
+        .outerjoin(models.Role, models.Role.name == models.User.role)
+        .filter(models.User.id == user_id)
+        .one()
+    )
+    return role_version or 0, user_version
+
+
+def bump_user_permission_version(db: Session, user_id: int):
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {"perm_version": models.User.perm_version + 1}, synchronize_session=False
+    )
+
+
+def build_token_claims(db: Session, user: models.User):
+    # The version is read before the masks: a write landing in between leaves the
+    # token with an outdated version, which only costs a DB fallback.
+    version = get_permission_version(db, user.id)
+    permission_cache.remember_version(user.id, user.role, version)
+    return utils.user_claims(user, get_permission_masks(db, user.id), version)
+
+
+class InvalidRefreshToken(Exception):
+    def __init__(self, reason: str, detail: str = "Invalid refresh token", status_code: int = 401):
+        super().__init__(detail)
+        self.reason = reason
+        self.detail = detail
+        self.status_code = status_code
+
+
+def _refresh_expiry():
+    return int(time.time()) + config.REFRESH_TOKEN_EXPIRE_DAYS * 86400
+
+
+def issue_refresh_token(db: Session, user_id: int):
+    # Starts a new session; returns (refresh_token, family_id). The user's expired
+    # sessions are dropped here, which keeps the table bounded without a sweeper.
+    family_id = uuid.uuid4().hex
+    token = utils.new_refresh_token(family_id)
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.user_id == user_id, models.RefreshToken.expires_at <= int(time.time())
+    ).delete(synchronize_session=False)
+    db.add(models.RefreshToken(
+        id=family_id, user_id=user_id, token_hash=utils.hash_refresh_token(token), expires_at=_refresh_expiry()
+    ))
+    db.commit()
+    return token, family_id
+
+
+def rotate_refresh_token(db: Session, token: str):
+    # Swaps the session's current token for a new one; returns (user, token, family_id).
+    # Presenting the token the current one replaced means it was replayed or
+    # stolen, so the whole session is revoked. Any other mismatch is just an
+    # invalid token: the session id is readable in every access token ("fam"),
+    # so a guessed token must not be able to end someone else's session.
+    family_id = token.partition(".")[0]
+    session = db.query(models.RefreshToken).filter(models.RefreshToken.id == family_id).first()
+    if session is None or session.expires_at <= time.time():
+        raise InvalidRefreshToken("invalid_refresh_token")
+
+    old_hash = utils.hash_refresh_token(token)
+    if not hmac.compare_digest(session.token_hash, old_hash):
+        if session.previous_hash and hmac.compare_digest(session.previous_hash, old_hash):
+            revoke_refresh_tokens(db, family_id=family_id)
+            raise InvalidRefreshToken("refresh_token_reuse")
+        raise InvalidRefreshToken("invalid_refresh_token")
+
+    user = db.get(models.User, session.user_id)
+    if user is None or not user.is_active:
+        revoke_refresh_tokens(db, family_id=family_id)
+        raise InvalidRefreshToken("inactive_account", "Account not approved by Superadmin", 403)
+
+    new_token = utils.new_refresh_token(family_id)
+    # Compare-and-swap on the old hash: of two concurrent refreshes with the same
+    # token only one can win, and the loser is treated as reuse.
+    rotated = db.query(models.RefreshToken).filter(
+        models.RefreshToken.id == family_id, models.RefreshToken.token_hash == old_hash
+    ).update(
+        {
+            "token_hash": utils.hash_refresh_token(new_token),
+            "previous_hash": old_hash,
+            "expires_at": _refresh_expiry(),
+        },
+        synchronize_session=False,
+    )
+    if not rotated:
+        db.rollback()
+        revoke_refresh_tokens(db, family_id=family_id)
+        raise InvalidRefreshToken("refresh_token_reuse")
+    db.commit()
+    return user, new_token, family_id
+
+
+def revoke_refresh_tokens(db: Session, user_id: int = None, family_id: str = None):
+    query = db.query(models.RefreshToken)
+    if family_id is not None:
+        query = query.filter(models.RefreshToken.id == family_id)
+    if user_id is not None:
+        query = query.filter(models.RefreshToken.user_id == user_id)
+    query.delete(synchronize_session=False)
+    db.commit()
+
+
 def approve_user(db: Session, user_id: int):
     user = db.query(models.User).get(user_id)
     if not user:
         return None
     user.is_active = True
+    bump_user_permission_version(db, user.id)
     db.commit()
+    invalidation_bus.publish("user", user.id)
     return user
 
 
 
+def dialect_insert(db: Session, model):
+    # Both supported backends implement INSERT ... ON CONFLICT with the same API.
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite_insert(model)
+    return pg_insert(model)
+
+
+def resolve_resources(db: Session, names):
+    names = list(dict.fromkeys(names))
+    db.execute(
+        dialect_insert(db, models.Resource)
+        .values([{"name": name} for name in names])
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    rows = db.query(models.Resource.name, models.Resource.id).filter(models.Resource.name.in_(names)).all()
+    return dict(rows)
+
+
+def upsert_assignments(db: Session, user_id: int, permissions: dict):
+    # permissions maps resource name -> permission string. Two statements whatever
+    # the number of resources: one resolve/insert of the resources, one upsert.
+    if not permissions:
+        return
+    resource_ids = resolve_resources(db, permissions.keys())
+    stmt = dialect_insert(db, models.UserResource).values([
+        {"user_id": user_id, "resource_id": resource_ids[name], "permissions": perms}
+        for name, perms in permissions.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "resource_id"],
+        set_={"permissions": stmt.excluded.permissions},
+    )
+    db.execute(stmt)
+
+
+
 def assign_resource(db: Session, user_id: int, resource_name: str, permissions: str):
-    user = db.query(models.User).get(user_id)
+    user = db.get(models.User, user_id)
     if not user:
         return None
 
-    
-    resource = db.query(models.Resource).filter_by(name=resource_name).first()
-    if not resource:
-        resource = models.Resource(name=resource_name)
-        db.add(resource)
-        db.commit()
-        db.refresh(resource)
-
-    
-    existing_assignment = db.query(models.UserResource).filter_by(
-        user_id=user.id,
-        resource_id=resource.id
-    ).first()
-
-    if existing_assignment:
-        
-        existing_assignment.permissions = permissions
-    else:
-        
-        user_resource = models.UserResource(
-            user_id=user.id,
-            resource_id=resource.id,
-            permissions=permissions
-        )
-        db.add(user_resource)
-
+    upsert_assignments(db, user.id, {resource_name: permissions})
+    refresh_user_permissions(db, user.id)
+    bump_user_permission_version(db, user.id)
     db.commit()
+    invalidation_bus.publish("user", user.id)
     return {
         "user": user.email,
-        "resource": resource.name,
+        "resource": resource_name,
         "permissions": permissions
     }
 
 
 
 def approve_and_assign(db: Session, user_id: int, role: str, resources: list):
-    user = db.query(models.User).get(user_id)
+    user = db.get(models.User, user_id)
     if not user:
         return None
-    
+
     user.is_active = True
     user.role = role
+    db.flush()
+
+    # Later entries win when the same resource is listed twice, as they did when
+    # the assignments were applied one by one.
+    upsert_assignments(db, user.id, {res.resource_name: res.permissions for res in resources})
+    refresh_user_permissions(db, user.id)
+    bump_user_permission_version(db, user.id)
     db.commit()
+    invalidation_bus.publish("user", user.id)
+    return user
+
+
+
+# Effective permissions: a UserResource row for (user, resource) overrides the
+# role template for that resource; otherwise the user's role template applies.
+# The result is kept materialized in effective_permissions.
+
+def _override_exists(user_id_column, resource_id_column):
+    return exists().where(
+        models.UserResource.user_id == user_id_column,
+        models.UserResource.resource_id == resource_id_column,
+    )
+
+
+def materialize_role_grants(db: Session, user_condition, resource_ids=None):
+    # One INSERT ... SELECT for every matching user, however many there are.
+    grants = (
+        select(models.User.id, models.RolePermission.resource_id, models.RolePermission.mask)
+        .join(models.Role, models.Role.name == models.User.role)
+        .join(models.RolePermission, models.RolePermission.role_id == models.Role.id)
+        .where(user_condition, ~_override_exists(models.User.id, models.RolePermission.resource_id))
+    )
+    if resource_ids is not None:
+        grants = grants.where(models.RolePermission.resource_id.in_(resource_ids))
+    stmt = dialect_insert(db, models.EffectivePermission).from_select(["user_id", "resource_id", "mask"], grants)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "resource_id"],
+        set_={"mask": stmt.excluded.mask},
+    )
+    db.execute(stmt)
+
 
-    for res in resources:
-        resource = db.query(models.Resource).filter_by(name=res.resource_name).first()
-        if not resource:
-            resource = models.Resource(name=res.resource_name)
-            db.add(resource)
-            db.commit()
-            db.refresh(resource)
-
-        existing_assignment = db.query(models.UserResource).filter_by(
-            user_id=user.id,
-            resource_id=resource.id
-        ).first()
-
-        if existing_assignment:
-            existing_assignment.permissions = res.permissions
-        else:
-            user_resource = models.UserResource(
-                user_id=user.id,
-                resource_id=resource.id,
-                permissions=res.permissions
-            )
-            db.add(user_resource)
+def refresh_user_permissions(db: Session, user_id: int):
+    db.query(models.EffectivePermission).filter(
+        models.EffectivePermission.user_id == user_id
+    ).delete(synchronize_session=False)
+    overrides = db.query(models.UserResource.resource_id, models.UserResource.permissions).filter(
+        models.UserResource.user_id == user_id
+    ).all()
+    if overrides:
+        db.execute(models.EffectivePermission.__table__.insert(), [
+            {"user_id": user_id, "resource_id": resource_id, "mask": to_mask(perms)}
+            for resource_id, perms in overrides
+        ])
+    materialize_role_grants(db, models.User.id == user_id)
 
+
+def get_role_templates(db: Session):
+    rows = (
+        db.query(models.Role.name, models.Resource.name, models.RolePermission.mask)
+        .outerjoin(models.RolePermission, models.RolePermission.role_id == models.Role.id)
+        .outerjoin(models.Resource, models.Resource.id == models.RolePermission.resource_id)
+        .order_by(models.Role.name, models.Resource.name)
+        .all()
+    )
+    templates = {}
+    for role_name, resource_name, mask in rows:
+        resources = templates.setdefault(role_name, [])
+        if resource_name is not None:
+            resources.append({"resource_name": resource_name, "permissions": to_permissions(mask)})
+    return [{"name": name, "resources": resources} for name, resources in templates.items()]
+
+
+def set_role_permissions(db: Session, role_name: str, permissions: dict):
+    # Replaces the role's template. Only resources whose mask actually changed are
+    # re-materialized, each with one set-based statement across all role members.
+    role = db.query(models.Role).filter_by(name=role_name).first()
+    if not role:
+        role = models.Role(name=role_name)
+        db.add(role)
+        db.flush()
+
+    resource_ids = resolve_resources(db, permissions.keys()) if permissions else {}
+    wanted = {resource_ids[name]: to_mask(perms) for name, perms in permissions.items()}
+    wanted = {resource_id: mask for resource_id, mask in wanted.items() if mask}
+    current = dict(
+        db.query(models.RolePermission.resource_id, models.RolePermission.mask)
+        .filter(models.RolePermission.role_id == role.id)
+        .all()
+    )
+    changed = {resource_id: mask for resource_id, mask in wanted.items() if current.get(resource_id) != mask}
+    removed = [resource_id for resource_id in current if resource_id not in wanted]
+
+    if changed:
+        stmt = dialect_insert(db, models.RolePermission).values([
+            {"role_id": role.id, "resource_id": resource_id, "mask": mask}
+            for resource_id, mask in changed.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["role_id", "resource_id"],
+            set_={"mask": stmt.excluded.mask},
+        )
+        db.execute(stmt)
+        materialize_role_grants(db, models.User.role == role_name, list(changed))
+
+    if removed:
+        db.query(models.RolePermission).filter(
+            models.RolePermission.role_id == role.id,
+            models.RolePermission.resource_id.in_(removed),
+        ).delete(synchronize_session=False)
+        role_members = select(models.User.id).where(models.User.role == role_name)
+        db.query(models.EffectivePermission).filter(
+            models.EffectivePermission.resource_id.in_(removed),
+            models.EffectivePermission.user_id.in_(role_members),
+            ~_override_exists(models.EffectivePermission.user_id, models.EffectivePermission.resource_id),
+        ).delete(synchronize_session=False)
+
+    if changed or removed:
+        db.query(models.Role).filter(models.Role.id == role.id).update(
+            {"perm_version": models.Role.perm_version + 1}, synchronize_session=False
+        )
     db.commit()
-    return user
+    invalidation_bus.publish("role", role_name)
+    return {"role": role_name, "changed": len(changed), "removed": len(removed)}
+
+
+
+# Denormalized post counters. Each adjustment is a single atomic statement in the
+# caller's transaction, so the counters move together with the rows they count.
+
+def adjust_comment_count(db: Session, post_id: int, delta: int):
+    db.query(models.Post).filter(models.Post.id == post_id).update(
+        {models.Post.comment_count: models.Post.comment_count + delta}, synchronize_session=False
+    )
+
+
+def adjust_reaction_count(db: Session, post_id: int, reaction_type: str, delta: int):
+    counts = models.PostReactionCount
+    if delta > 0:
+        stmt = dialect_insert(db, counts).values(post_id=post_id, reaction_type=reaction_type, count=delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["post_id", "reaction_type"],
+            set_={"count": counts.count + stmt.excluded.count},
+        )
+        db.execute(stmt)
+    else:
+        db.query(counts).filter(counts.post_id == post_id, counts.reaction_type == reaction_type).update(
+            {counts.count: counts.count + delta}, synchronize_session=False
+        )
+
+
+def adjust_comment_counts(db: Session, deltas: dict):
+    # deltas maps post id -> change; one UPDATE whatever the number of posts.
+    if not deltas:
+        return
+    db.query(models.Post).filter(models.Post.id.in_(list(deltas))).update(
+        {models.Post.comment_count: models.Post.comment_count + case(deltas, value=models.Post.id, else_=0)},
+        synchronize_session=False,
+    )
+
+
+def add_reaction_counts(db: Session, deltas: dict):
+    # deltas maps (post id, reaction type) -> positive change; one multi-row upsert.
+    if not deltas:
+        return
+    counts = models.PostReactionCount
+    stmt = dialect_insert(db, counts).values([
+        {"post_id": post_id, "reaction_type": reaction_type, "count": delta}
+        for (post_id, reaction_type), delta in deltas.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["post_id", "reaction_type"],
+        set_={"count": counts.count + stmt.excluded.count},
+    )
+    db.execute(stmt)
+
+
+def bulk_create(db: Session, model, rows: list):
+    # Chunked multi-row INSERT ... RETURNING id inside the caller's transaction;
+    # ids come back in the order of rows.
+    ids = []
+    for start in range(0, len(rows), config.BATCH_INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + config.BATCH_INSERT_CHUNK_SIZE]
+        stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+        ids.extend(db.execute(stmt, chunk).scalars())
+    return ids
+
+
+def get_comment_count(db: Session, post_id: int):
+    return db.query(models.Post.comment_count).filter(models.Post.id == post_id).scalar()
+
+
+def get_reaction_counts(db: Session, post_id: int):
+    rows = (
+        db.query(models.PostReactionCount.reaction_type, models.PostReactionCount.count)
+        .filter(models.PostReactionCount.post_id == post_id, models.PostReactionCount.count > 0)
+        .all()
+    )
+    if not rows and db.get(models.Post, post_id) is None:
+        return None
+    return dict(rows)
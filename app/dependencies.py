@@ -1,31 +1,119 @@
+import functools
 from fastapi import Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from jose import jwt, JWTError
-from app import config, models, database
+from app import config, crud, models, database, metrics
+from app.permission_cache import permission_cache
+from app.revocation import token_denylist
 
 security = HTTPBearer()  
 
-def get_db():
+def get_sync_db():
     db = database.SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    token = credentials.credentials  
+
+async def get_async_db():
+    async with database.AsyncSessionLocal() as db:
+        yield db
+
+
+get_db = get_async_db if config.DB_ASYNC else get_sync_db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    # Lets async handlers call the sync crud functions without blocking the loop.
+    if config.DB_ASYNC:
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+def db_endpoint(fn):
+    # In async mode the endpoint body runs through AsyncSession.run_sync: the code
+    # keeps using a regular Session, but its I/O goes through the async driver on
+    # the event loop instead of occupying a threadpool slot.
+    if not config.DB_ASYNC:
+        return fn
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        db = kwargs["db"]
+        return await db.run_sync(lambda session: fn(*args, **{**kwargs, "db": session}))
+
+    return wrapper
+
+class Principal:
+    # Lightweight stand-in for models.User built only from token claims.
+    __slots__ = ("id", "email", "role", "is_active", "permissions")
+
+    def __init__(self, id: int, email: str, role: str, is_active: bool, permissions: dict):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.is_active = is_active
+        self.permissions = permissions
+
+
+def principal_from_claims(payload: dict):
+    user_id = payload.get("uid")
+    version = payload.get("pv")
+    if user_id is None or version is None:
+        return None
+    # Any assignment, approval or template change since the token was issued bumps
+    # the stored version; the embedded claims are stale then. A version this
+    # process has not read from the DB yet is never taken as a match: the caller
+    # falls back to the DB, which also caches the current version.
+    current = permission_cache.stored_version(user_id, payload.get("role"))
+    if current is None or tuple(version) != current:
+        return None
+    return Principal(
+        id=user_id,
+        email=payload["sub"],
+        role=payload.get("role"),
+        is_active=payload.get("active", False),
+        permissions=payload.get("perms") or {},
+    )
+
+
+def get_token_claims(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
 
     try:
         payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+        if payload.get("sub") is None:
+            metrics.auth_failures_total.inc("invalid_token", "401")
             raise HTTPException(status_code=401, detail="Invalid token")
     except JWTError:
+        metrics.auth_failures_total.inc("invalid_token", "401")
         raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
+
+
+@db_endpoint
+def get_current_user(payload: dict = Depends(get_token_claims), db: Session = Depends(get_db)):
+    # The revocation check is answered from memory (the backend is only queried to
+    # confirm a Bloom filter positive); the users lookup below is not.
+    if token_denylist.is_revoked(db, payload):
+        metrics.auth_failures_total.inc("revoked_token", "401")
+        raise HTTPException(status_code=401, detail="Token revoked")
 
-    user = db.query(models.User).filter(models.User.email == email).first()
+    if config.AUTH_STATELESS:
+        principal = principal_from_claims(payload)
+        if principal is not None:
+            return principal
+
+    user = db.query(models.User).filter(models.User.email == payload["sub"]).first()
     if not user:
+        metrics.auth_failures_total.inc("unknown_user", "404")
         raise HTTPException(status_code=404, detail="User not found")
 
+    if config.AUTH_STATELESS and payload.get("pv") is not None:
+        # Lets this user's next requests take the stateless path if the token is current.
+        permission_cache.remember_version(user.id, user.role, crud.get_permission_version(db, user.id))
+
     return user
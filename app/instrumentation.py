@@ -0,0 +1,95 @@
+import logging
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+from app import config, metrics
+
+logger = logging.getLogger("app.sql")
+
+
+class RequestQueryStats:
+    __slots__ = ("count", "total_time", "slowest_time", "slowest_statement")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+
+# The stats object is created per request by the middleware. It is mutated in
+# place, so it also collects statements run from threadpool workers, which see a
+# copy of the request's context.
+_current_stats = ContextVar("request_query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started_at"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = conn.info.pop("query_started_at", None)
+    if started_at is None:
+        return
+    elapsed = time.perf_counter() - started_at
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    if elapsed * 1000 >= config.SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, statement[:1000])
+
+
+def install_query_hooks(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryMetricsMiddleware:
+    # Plain ASGI middleware: adds Server-Timing / X-DB-Query-Count / X-DB-Slowest-Ms
+    # to the response and feeds the per-route query histograms on /metrics, without
+    # wrapping the body. The slowest statement itself is only logged (at DEBUG).
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = _current_stats.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((
+                    b"server-timing",
+                    f'db;dur={stats.total_time * 1000:.2f};desc="{stats.count} queries", '
+                    f'db-slowest;dur={stats.slowest_time * 1000:.2f}'.encode(),
+                ))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-slowest-ms", f"{stats.slowest_time * 1000:.2f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_stats.reset(token)
+            route = metrics.route_template(scope)
+            if stats.slowest_statement is not None:
+                logger.debug(
+                    "%s %s: %d queries, %.2f ms total, slowest %.2f ms: %s",
+                    scope["method"], route or scope["path"], stats.count, stats.total_time * 1000,
+                    stats.slowest_time * 1000, stats.slowest_statement[:1000],
+                )
+            if route is not None:
+                metrics.db_queries_per_request.observe(stats.count, scope["method"], route)
+                metrics.db_time_seconds.observe(stats.total_time, scope["method"], route)
@@ -0,0 +1,232 @@
+import json
+import logging
+import select
+import threading
+import uuid
+from app import config
+from app.permission_cache import permission_cache
+
+logger = logging.getLogger("app.invalidation")
+
+
+# Cache invalidations are applied locally first and then broadcast, so every
+# worker bumps the same user/role versions within a round trip of the
+# bus. Messages carry the sending bus's origin id and are ignored on the way back.
+# A listener that loses its connection may have missed messages, so it drops all
+# local cache state when it reconnects.
+class InvalidationBus:
+    name = "base"
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self._handlers = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.published = 0
+        self.received = 0
+        self.send_errors = 0
+        self.reconnects = 0
+
+    def on(self, kind: str, handler):
+        self._handlers.setdefault(kind, []).append(handler)
+
+    def publish(self, kind: str, key=None):
+        self._apply(kind, key)
+        payload = json.dumps({"origin": self.origin, "kind": kind, "key": key})
+        try:
+            self._send(payload)
+            self.published += 1
+        except Exception:
+            # The local cache is already correct; other workers fall back to the TTL.
+            self.send_errors += 1
+            logger.exception("Failed to broadcast %s invalidation", kind)
+
+    def _receive(self, payload):
+        if isinstance(payload, bytes):
+            payload = payload.decode()
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed invalidation message: %r", payload[:200])
+            return
+        if message.get("origin") == self.origin:
+            return
+        self.received += 1
+        self._apply(message.get("kind"), message.get("key"))
+
+    def _apply(self, kind, key):
+        for handler in self._handlers.get(kind, ()):
+            handler(key)
+
+    def resync(self):
+        self.reconnects += 1
+        self._apply("all", None)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen_forever, name=f"invalidation-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _listen_forever(self):
+        first = True
+        while not self._stop.is_set():
+            try:
+                if not first:
+                    self.resync()
+                first = False
+                self._listen()
+            except Exception:
+                logger.exception("Invalidation listener failed; reconnecting")
+                self._stop.wait(1.0)
+
+    def _listen(self):
+        raise NotImplementedError
+
+    def _send(self, payload: str):
+        raise NotImplementedError
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "channel": self.channel,
+            "published": self.published,
+            "received": self.received,
+            "send_errors": self.send_errors,
+            "reconnects": self.reconnects,
+        }
+
+
+class MemoryBus(InvalidationBus):
+    # Delivers synchronously to every started bus on the same channel in this
+    # process. Enough for a single worker, and for tests that start two buses
+    # to stand in for two workers.
+    name = "memory"
+    _channels = {}
+    _lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            peers = self._channels.setdefault(self.channel, [])
+            if self not in peers:
+                peers.append(self)
+
+    def stop(self):
+        with self._lock:
+            peers = self._channels.get(self.channel, [])
+            if self in peers:
+                peers.remove(self)
+
+    def _send(self, payload: str):
+        with self._lock:
+            peers = list(self._channels.get(self.channel, ()))
+        for peer in peers:
+            if peer is not self:
+                peer._receive(payload)
+
+
+class PostgresBus(InvalidationBus):
+    # LISTEN/NOTIFY on a dedicated autocommit psycopg2 connection per direction.
+    name = "postgres"
+
+    def __init__(self, channel: str, url: str):
+        if not channel.isidentifier():
+            raise ValueError(f"Invalid invalidation channel name: {channel!r}")
+        super().__init__(channel)
+        self.url = url
+        self._send_conn = None
+        self._send_lock = threading.Lock()
+
+    def _connect(self):
+        import psycopg2
+        from sqlalchemy.engine import make_url
+
+        url = make_url(self.url).set(drivername="postgresql")
+        conn = psycopg2.connect(url.render_as_string(hide_password=False))
+        conn.autocommit = True
+        return conn
+
+    def _listen(self):
+        conn = self._connect()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            while not self._stop.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._receive(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+    def _send(self, payload: str):
+        with self._send_lock:
+            for attempt in (1, 2):
+                try:
+                    if self._send_conn is None or self._send_conn.closed:
+                        self._send_conn = self._connect()
+                    with self._send_conn.cursor() as cursor:
+                        cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+                    return
+                except Exception:
+                    self._send_conn = None
+                    if attempt == 2:
+                        raise
+
+
+class RedisBus(InvalidationBus):
+    # Redis pub/sub. The client can be injected (e.g. a fakeredis instance in
+    # tests); otherwise one is created from the URL.
+    name = "redis"
+
+    def __init__(self, channel: str, url: str = None, client=None):
+        super().__init__(channel)
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(self.channel)
+            while not self._stop.is_set():
+                message = pubsub.get_message(timeout=1.0)
+                if message and message.get("type") == "message":
+                    self._receive(message["data"])
+        finally:
+            pubsub.close()
+
+    def _send(self, payload: str):
+        self.client.publish(self.channel, payload)
+
+
+def create_bus():
+    backend = config.INVALIDATION_BACKEND
+    if backend == "memory":
+        return MemoryBus(config.INVALIDATION_CHANNEL)
+    if backend == "postgres":
+        return PostgresBus(config.INVALIDATION_CHANNEL, config.INVALIDATION_URL or config.DATABASE_URL)
+    if backend == "redis":
+        return RedisBus(config.INVALIDATION_CHANNEL, config.INVALIDATION_URL or "redis://localhost:6379/0")
+    raise ValueError(f"Unknown INVALIDATION_BACKEND: {backend!r}")
+
+
+def attach_permission_cache(bus: InvalidationBus, cache=permission_cache):
+    bus.on("user", cache.invalidate_user)
+    bus.on("role", cache.invalidate_role)
+    bus.on("all", lambda _key: cache.invalidate_all())
+    return bus
+
+
+invalidation_bus = attach_permission_cache(create_bus())
@@ -1,18 +1,56 @@
 from fastapi import FastAPI
-from sqlalchemy.orm import Session
-from app import models, database, crud, schemas, config
+from fastapi.responses import PlainTextResponse
+from app import bootstrap, database, config, instrumentation, metrics, response_cache
+from app.pool_metrics import pool_stats
+from app.password_pool import password_pool
+from app.invalidation import invalidation_bus
+from app.policy import permission_sync, start_permission_sync
+from app.revocation import start_denylist, token_denylist
 from routes import auth, superadmin, resources
 
 
-models.Base.metadata.create_all(bind=database.engine)
-
-
 app = FastAPI(
     title="FastAPI RBAC System",
     description="Role-Based Access Control with CRUD permissions for each resource",
     version="1.0.0"
 )
 
+if config.QUERY_METRICS_ENABLED:
+    instrumentation.install_query_hooks(database.engine)
+    if database.async_engine is not None:
+        instrumentation.install_query_hooks(database.async_engine.sync_engine)
+    app.add_middleware(instrumentation.QueryMetricsMiddleware)
+
+if config.RESPONSE_CACHE_ENABLED:
+    response_cache.install_write_tracking()
+
+if config.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.registry.start_flusher()
+
+    @metrics.registry.gauge_callback
+    def pool_gauges():
+        pools = {"sync": database.engine.pool}
+        if database.async_engine is not None:
+            pools["async"] = database.async_engine.pool
+        stats = {name: pool_stats(pool) for name, pool in pools.items()}
+        return [
+            ("rbac_db_pool_size", "Configured pool size.",
+             {(name,): s["size"] for name, s in stats.items()}, ("engine",)),
+            ("rbac_db_pool_checked_out", "Connections currently checked out.",
+             {(name,): s["checked_out"] for name, s in stats.items()}, ("engine",)),
+            ("rbac_db_pool_overflow", "Connections open beyond the pool size.",
+             {(name,): s["overflow"] for name, s in stats.items()}, ("engine",)),
+            ("rbac_db_pool_checkout_timeouts", "Checkouts that timed out waiting for a connection.",
+             {(name,): s.get("checkout_timeouts", 0) for name, s in stats.items()}, ("engine",)),
+            ("rbac_password_pool_in_flight", "Password hash/verify jobs running or queued.",
+             {(): password_pool.stats()["in_flight"]}, ()),
+        ]
+
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        return PlainTextResponse(metrics.registry.exposition(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def root():
     return {
@@ -22,39 +60,20 @@ def root():
 
 @app.on_event("startup")
 def startup_tasks():
-    db: Session = database.SessionLocal()
-    try:
-        
-        superadmin_user = crud.get_user_by_email(db, config.SUPERADMIN_EMAIL)
-        if not superadmin_user:
-            crud.create_user(
-                db,
-                schemas.UserCreate(
-                    name="Super Admin",
-                    email=config.SUPERADMIN_EMAIL,
-                    password=config.SUPERADMIN_PASSWORD,
-                    role="superadmin"
-                ),
-                role="superadmin"
-            )
-            print("Superadmin created successfully.")
-
-        
-        default_resources = [
-            "create_post",
-            "comment_post",
-            "manage_post",
-            "creating_event",
-            "creating_poll",
-            "reaction_post"
-        ]
-        for res in default_resources:
-            if not db.query(models.Resource).filter_by(name=res).first():
-                db.add(models.Resource(name=res))
-        db.commit()
-        print("Default resources created successfully.")
-    finally:
-        db.close()
+    # Schema migrations and seed data are handled by `python -m app.bootstrap`,
+    # run once per deploy; workers do not touch the schema.
+    if config.BOOTSTRAP_ON_STARTUP:
+        bootstrap.bootstrap()
+    start_denylist()
+    start_permission_sync()
+    invalidation_bus.start()
+
+
+@app.on_event("shutdown")
+def shutdown_tasks():
+    token_denylist.stop()
+    permission_sync.stop()
+    invalidation_bus.stop()
 
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
@@ -0,0 +1,311 @@
+import bisect
+import json
+import os
+import threading
+import time
+from app import config
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# Each thread writes only to its own shard, so recording a sample never takes a
+# lock; a scrape sums the shards. The lock below is only taken the first time a
+# thread records anything.
+class _Shards:
+    def __init__(self):
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def mine(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._all.append(shard)
+        return shard
+
+    def items(self):
+        with self._lock:
+            shards = list(self._all)
+        for shard in shards:
+            while True:
+                try:
+                    yield from list(shard.items())
+                    break
+                except RuntimeError:
+                    # The owning thread added a key while we were copying.
+                    continue
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._shards = _Shards()
+
+    def inc(self, *labels, amount: float = 1):
+        shard = self._shards.mine()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def collect(self):
+        totals = {}
+        for labels, value in self._shards.items():
+            totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._shards = _Shards()
+
+    def observe(self, value: float, *labels):
+        shard = self._shards.mine()
+        series = shard.get(labels)
+        if series is None:
+            # Per-bucket counts followed by sum and count.
+            series = shard[labels] = [0] * (len(self.buckets) + 3)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def collect(self):
+        totals = {}
+        for labels, series in self._shards.items():
+            total = totals.setdefault(labels, [0] * len(series))
+            for i, value in enumerate(series):
+                total[i] += value
+        return totals
+
+    def snapshot(self, *labels):
+        # One series in JSON-friendly form, with cumulative bucket counts.
+        series = self.collect().get(labels, [0] * (len(self.buckets) + 3))
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip([str(bound) for bound in self.buckets] + ["+Inf"], series[:-2]):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"count": series[-1], "sum": series[-2], "buckets": buckets}
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._gauge_callbacks = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge_callback(self, fn):
+        # fn() returns [(name, help, {label_tuple: value}, labelnames)], read at scrape time.
+        self._gauge_callbacks.append(fn)
+        return fn
+
+    def snapshot(self):
+        return {
+            metric.name: {
+                "kind": metric.kind,
+                "help": metric.help,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", ())),
+                "series": [[list(labels), value] for labels, value in metric.collect().items()],
+            }
+            for metric in self._metrics
+        }
+
+    def gauges(self):
+        pid = str(os.getpid())
+        collected = []
+        for callback in self._gauge_callbacks:
+            for name, help, series, labelnames in callback():
+                collected.append({
+                    "name": name,
+                    "help": help,
+                    "labelnames": list(labelnames) + ["pid"],
+                    "series": [[list(labels) + [pid], value] for labels, value in series.items()],
+                })
+        return collected
+
+    # Multiprocess support: every worker periodically dumps its metrics to
+    # METRICS_MULTIPROC_DIR; a scrape on any worker merges all dumps.
+    def _dump_path(self):
+        return os.path.join(config.METRICS_MULTIPROC_DIR, f"metrics-{os.getpid()}.json")
+
+
+    def flush(self):
+        if not config.METRICS_MULTIPROC_DIR:
+            return
+        path = self._dump_path()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as handle:
+            json.dump({"metrics": self.snapshot(), "gauges": self.gauges()}, handle)
+        os.replace(tmp_path, path)
+
+    def start_flusher(self):
+        if not config.METRICS_MULTIPROC_DIR:
+            return
+        os.makedirs(config.METRICS_MULTIPROC_DIR, exist_ok=True)
+
+        def loop():
+            while True:
+                time.sleep(config.METRICS_FLUSH_INTERVAL)
+                self.flush()
+
+        threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+
+    def _merged(self):
+        metrics, gauges = self.snapshot(), self.gauges()
+        if not config.METRICS_MULTIPROC_DIR:
+            return metrics, gauges
+        own = os.path.basename(self._dump_path())
+        # Counters of exited workers are kept so totals never go backwards; their
+        # gauges are dropped once the dump stops being refreshed.
+        stale_before = time.time() - 3 * config.METRICS_FLUSH_INTERVAL
+        for filename in os.listdir(config.METRICS_MULTIPROC_DIR):
+            if not filename.endswith(".json") or filename == own:
+                continue
+            path = os.path.join(config.METRICS_MULTIPROC_DIR, filename)
+            try:
+                with open(path) as handle:
+                    other = json.load(handle)
+                fresh = os.path.getmtime(path) >= stale_before
+            except (OSError, ValueError):
+                continue
+            for name, data in other["metrics"].items():
+                target = metrics.get(name)
+                if target is None:
+                    continue
+                index = {tuple(labels): i for i, (labels, _) in enumerate(target["series"])}
+                for labels, value in data["series"]:
+                    i = index.get(tuple(labels))
+                    if i is None:
+                        target["series"].append([labels, value])
+                    elif isinstance(value, list):
+                        target["series"][i][1] = [a + b for a, b in zip(target["series"][i][1], value)]
+                    else:
+                        target["series"][i][1] += value
+            if fresh:
+                gauges.extend(other["gauges"])
+        return metrics, gauges
+
+    def exposition(self):
+        metrics, gauges = self._merged()
+        lines = []
+        for name, data in metrics.items():
+            lines.append(f"# HELP {name} {data['help']}")
+            lines.append(f"# TYPE {name} {data['kind']}")
+            for labels, value in data["series"]:
+                pairs = list(zip(data["labelnames"], labels))
+                if data["kind"] == "counter":
+                    lines.append(f"{name}{_labels(pairs)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(data["buckets"] + ["+Inf"], value[:-2]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(pairs + [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(pairs)} {value[-2]}")
+                lines.append(f"{name}_count{_labels(pairs)} {value[-1]}")
+        described = set()
+        for gauge in gauges:
+            name = gauge["name"]
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {gauge['help']}")
+                lines.append(f"# TYPE {name} gauge")
+            for labels, value in gauge["series"]:
+                lines.append(f"{name}{_labels(list(zip(gauge['labelnames'], labels)))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+registry = Registry()
+
+
+def route_template(scope):
+    # Label requests by their route template (not the concrete path) to keep the
+    # number of series bounded. Depending on the FastAPI version, the matched
+    # route's path may or may not include the prefix of the router it was
+    # included from, so the prefix is recovered from the request path.
+    route = scope.get("route")
+    if route is None or not hasattr(route, "path_regex"):
+        return None
+    path = scope["path"]
+    start = 0
+    while start != -1:
+        if route.path_regex.match(path[start:]):
+            return path[:start] + route.path
+        start = path.find("/", start + 1)
+    return route.path
+
+
+http_requests_total = registry.counter(
+    "rbac_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_request_duration_seconds = registry.histogram(
+    "rbac_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+auth_failures_total = registry.counter(
+    "rbac_auth_failures_total", "Rejected authentication and authorization attempts.", ("reason", "status"))
+rate_limited_total = registry.counter(
+    "rbac_rate_limited_total", "Requests rejected by rate limits.", ("scope", "key"))
+db_queries_per_request = registry.histogram(
+    "rbac_db_queries_per_request", "SQL statements run per request, by route.", ("method", "route"),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+db_time_seconds = registry.histogram(
+    "rbac_db_time_seconds", "Time spent in SQL statements per request, by route.", ("method", "route"),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+db_pool_checkout_wait_seconds = registry.histogram(
+    "rbac_db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", ("engine",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+password_hash_seconds = registry.histogram(
+    "rbac_password_hash_seconds", "Time spent in bcrypt hash/verify.", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5))
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = route_template(scope) or "<unmatched>"
+            http_requests_total.inc(scope["method"], route, str(status))
+            http_request_duration_seconds.observe(time.perf_counter() - started, scope["method"], route)
@@ -1,13 +1,16 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Boolean, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .database import Base
 
 
 class UserResource(Base):
     __tablename__ = "user_resources"
+    __table_args__ = (
+        UniqueConstraint("user_id", "resource_id", name="uq_user_resources_user_id_resource_id"),
+    )
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    resource_id = Column(Integer, ForeignKey("resources.id"))
+    resource_id = Column(Integer, ForeignKey("resources.id"), index=True)
     permissions = Column(String)  # e.g. CRUD, R, CU
 
     user = relationship("User", back_populates="user_resources")
@@ -20,8 +23,11 @@ class User(Base):
     name = Column(String, nullable=False)
     email = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
-    role = Column(String, nullable=False)
+    role = Column(String, nullable=False, index=True)
     is_active = Column(Boolean, default=False)  # Boolean instead of Integer
+    # Bumped in the same transaction as any change to the user's role, status or
+    # assignments; stateless tokens are only trusted while theirs matches.
+    perm_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     user_resources = relationship("UserResource", back_populates="user")
     posts = relationship("Post", back_populates="owner")
@@ -31,6 +37,68 @@ class User(Base):
     reactions = relationship("Reaction", back_populates="user")
 
 
+class Role(Base):
+    __tablename__ = "roles"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    # Bumped with every change to the role's template.
+    perm_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    permissions = relationship("RolePermission", back_populates="role")
+
+
+class RolePermission(Base):
+    # Role template: what every user with this role gets on a resource, unless the
+    # user has an explicit UserResource assignment for it.
+    __tablename__ = "role_permissions"
+    __table_args__ = (
+        UniqueConstraint("role_id", "resource_id", name="uq_role_permissions_role_id_resource_id"),
+    )
+    id = Column(Integer, primary_key=True)
+    role_id = Column(Integer, ForeignKey("roles.id"), nullable=False)
+    resource_id = Column(Integer, ForeignKey("resources.id"), nullable=False, index=True)
+    mask = Column(Integer, nullable=False)  # bitmask of C=1, R=2, U=4, D=8
+
+    role = relationship("Role", back_populates="permissions")
+    resource = relationship("Resource")
+
+
+class EffectivePermission(Base):
+    # Materialized result of role template + per-user overrides; the permission
+    # check is a primary key lookup on this table.
+    __tablename__ = "effective_permissions"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    resource_id = Column(Integer, ForeignKey("resources.id"), primary_key=True, index=True)
+    mask = Column(Integer, nullable=False)
+
+
+class RevokedToken(Base):
+    # Denylisted access tokens by jti; rows are pruned once the token has expired.
+    __tablename__ = "revoked_tokens"
+    jti = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    expires_at = Column(Integer, nullable=False, index=True)
+
+
+class TokenCutoff(Base):
+    # Tokens of this user issued before not_before are rejected.
+    __tablename__ = "token_cutoffs"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    not_before = Column(Float, nullable=False)
+
+
+class RefreshToken(Base):
+    # One row per login session. The id is the session (rotation family) id and is
+    # the prefix of the token; only keyed hashes of the current token and of the
+    # one it replaced are stored.
+    __tablename__ = "refresh_tokens"
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    token_hash = Column(String(64), nullable=False)
+    previous_hash = Column(String(64))
+    expires_at = Column(Integer, nullable=False, index=True)
+
+
 class Resource(Base):
     __tablename__ = "resources"
     id = Column(Integer, primary_key=True)
@@ -41,18 +109,35 @@ class Resource(Base):
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        Index("ix_posts_owner_id_id", "owner_id", "id"),
+    )
     id = Column(Integer, primary_key=True)
     title = Column(String, nullable=False)
     content = Column(Text, nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    # Maintained by the comment handlers; see crud.adjust_comment_count.
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     owner = relationship("User", back_populates="posts")
     comments = relationship("Comment", back_populates="post")
     reactions = relationship("Reaction", back_populates="post")
 
 
+class PostReactionCount(Base):
+    # Per-post reaction tallies by type, maintained by the reaction handlers.
+    __tablename__ = "post_reaction_counts"
+    post_id = Column(Integer, ForeignKey("posts.id"), primary_key=True)
+    reaction_type = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_post_id_id", "post_id", "id"),
+        Index("ix_comments_user_id_id", "user_id", "id"),
+    )
     id = Column(Integer, primary_key=True)
     post_id = Column(Integer, ForeignKey("posts.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -64,6 +149,10 @@ class Comment(Base):
 
 class ManagePost(Base):
     __tablename__ = "manage_posts"
+    __table_args__ = (
+        Index("ix_manage_posts_post_id_id", "post_id", "id"),
+        Index("ix_manage_posts_user_id_id", "user_id", "id"),
+    )
     id = Column(Integer, primary_key=True)
     post_id = Column(Integer, ForeignKey("posts.id"))
     action = Column(String, nullable=False)
@@ -72,6 +161,9 @@ class ManagePost(Base):
 
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        Index("ix_events_owner_id_id", "owner_id", "id"),
+    )
     id = Column(Integer, primary_key=True)
     title = Column(String, nullable=False)
     description = Column(Text)
@@ -82,6 +174,9 @@ class Event(Base):
 
 class Poll(Base):
     __tablename__ = "polls"
+    __table_args__ = (
+        Index("ix_polls_owner_id_id", "owner_id", "id"),
+    )
     id = Column(Integer, primary_key=True)
     question = Column(String, nullable=False)
     options = Column(Text, nullable=False)
@@ -92,6 +187,10 @@ class Poll(Base):
 
 class Reaction(Base):
     __tablename__ = "reactions"
+    __table_args__ = (
+        Index("ix_reactions_post_id_id", "post_id", "id"),
+        Index("ix_reactions_user_id_id", "user_id", "id"),
+    )
     id = Column(Integer, primary_key=True)
     post_id = Column(Integer, ForeignKey("posts.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
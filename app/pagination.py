@@ -0,0 +1,27 @@
+from typing import Optional
+from fastapi import Query, Response
+from app import config
+from app.serialization import select_columns
+
+
+class PageParams:
+    def __init__(
+        self,
+        cursor: Optional[int] = Query(None, ge=0, description="Return rows with an id greater than this"),
+        limit: int = Query(config.PAGE_DEFAULT_LIMIT, ge=1, le=config.PAGE_MAX_LIMIT),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+
+def paginate(query, model, page: PageParams, response: Response):
+    # Keyset pagination on the primary key: the cost of a page does not depend on
+    # how deep into the table it is, unlike OFFSET.
+    # Rows come back as plain dicts of the model's columns, ready to encode.
+    if page.cursor is not None:
+        query = query.filter(model.id > page.cursor)
+    rows = select_columns(query, model).order_by(model.id).limit(page.limit + 1).all()
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return [row._asdict() for row in rows]
@@ -0,0 +1,48 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app import config
+
+
+class PasswordPoolFull(Exception):
+    pass
+
+
+# bcrypt releases the GIL while hashing, so a small dedicated thread pool gives
+# real parallelism without tying up the request threadpool or the event loop.
+class PasswordWorkerPool:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordPoolFull()
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+
+    def stats(self):
+        pending = self._pending
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": pending,
+            "queue_depth": max(0, pending - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_pool = PasswordWorkerPool(config.PASSWORD_WORKERS, config.PASSWORD_MAX_PENDING)
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+from app import config
+
+
+# Compact bitmask form of the "CRUD" permission strings stored in UserResource.
+PERMISSION_BITS = {"C": 1, "R": 2, "U": 4, "D": 8}
+
+
+def to_mask(permissions: str) -> int:
+    mask = 0
+    for char in (permissions or "").upper():
+        mask |= PERMISSION_BITS.get(char, 0)
+    return mask
+
+
+def to_permissions(mask: int) -> str:
+    return "".join(char for char, bit in PERMISSION_BITS.items() if mask & bit)
+
+
+# LRU + TTL cache of permission masks keyed by (user_id, resource_name).
+# Entries are stamped with the cache epoch, the role's version and the user's
+# version when stored, so bumping any of them makes old entries unreachable
+# without scanning for them.
+class PermissionCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._user_versions = {}
+        self._role_versions = {}
+        self._epoch = 0
+        self._stored_versions = {}
+        self._durable_versions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, user_id: int, role: str = None):
+        return self._epoch, self._role_versions.get(role, 0), self._user_versions.get(user_id, 0)
+
+    def stored_version(self, user_id: int, role: str = None):
+        # (roles.perm_version, users.perm_version) as last read from the database,
+        # or None when either is unknown here or older than the TTL. The in-memory
+        # counters above start at 0 in every process and only stamp cache entries;
+        # stateless tokens are checked against these durable versions instead.
+        now = time.monotonic()
+        role_entry = self._stored_versions.get(("role", role))
+        user_entry = self._stored_versions.get(("user", user_id))
+        if role_entry is None or user_entry is None or role_entry[1] <= now or user_entry[1] <= now:
+            return None
+        return role_entry[0], user_entry[0]
+
+    def remember_version(self, user_id: int, role: str, version):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._stored_versions[("role", role)] = (version[0], expires_at)
+            self._stored_versions[("user", user_id)] = (version[1], expires_at)
+
+    def get(self, user_id: int, resource_name: str, role: str = None):
+        key = (user_id, resource_name)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            mask, version, expires_at = entry
+            if expires_at <= now or version != self.version(user_id, role):
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return mask
+
+    def set(self, user_id: int, resource_name: str, mask: int, version):
+        key = (user_id, resource_name)
+        with self._lock:
+            # version must be read before querying: a writer may bump it while the
+            # caller is querying, and storing under the old version keeps the
+            # stale mask unreachable.
+            self._entries[key] = (mask, version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self._user_versions[user_id] = self._user_versions.get(user_id, 0) + 1
+            self._stored_versions.pop(("user", user_id), None)
+
+    def invalidate_role(self, role: str):
+        with self._lock:
+            self._role_versions[role] = self._role_versions.get(role, 0) + 1
+            self._stored_versions.pop(("role", role), None)
+
+    def invalidate_all(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._stored_versions.clear()
+
+    def cached_user_ids(self):
+        with self._lock:
+            ids = {user_id for user_id, _ in self._entries}
+            ids.update(key[1] for key in self._stored_versions if key[0] == "user")
+        return ids
+
+    def reconcile(self, user_versions: dict, role_versions: dict) -> int:
+        # Invalidates every user and role whose durable perm_version differs from
+        # the one seen on the previous call. Anything seen for the first time is
+        # invalidated too, since it may have been cached before an earlier change.
+        current = {("user", key): value for key, value in user_versions.items()}
+        current.update((("role", key), value) for key, value in role_versions.items())
+        changed = [key for key, value in current.items() if self._durable_versions.get(key) != value]
+        self._durable_versions = current
+        for kind, key in changed:
+            if kind == "user":
+                self.invalidate_user(key)
+            else:
+                self.invalidate_role(key)
+        return len(changed)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+permission_cache = PermissionCache(
+    maxsize=config.PERMISSION_CACHE_SIZE,
+    ttl=config.PERMISSION_CACHE_TTL,
+)
@@ -0,0 +1,202 @@
+import logging
+import threading
+from fastapi import Depends, HTTPException
+from sqlalchemy.orm import Session
+from app import config, crud, database, metrics, models
+from app.dependencies import get_db, get_current_user, db_endpoint, Principal
+from app.invalidation import invalidation_bus
+from app.permission_cache import PERMISSION_BITS, permission_cache
+
+SUPERADMIN_ROLE = "superadmin"
+
+logger = logging.getLogger("app.policy")
+
+
+def action_bit(action: str) -> int:
+    bit = PERMISSION_BITS.get(action.upper())
+    if bit is None:
+        raise ValueError(f"Unknown action: {action!r}")
+    return bit
+
+
+# The one place permission decisions are made. Masks come from the token claims
+# (stateless principals), the permission cache, or a single effective_permissions
+# query keyed by resource id; resource names are resolved to ids once and kept.
+class PolicyEngine:
+    def __init__(self, cache=permission_cache):
+        self.cache = cache
+        self._resource_ids = {}
+        self._lock = threading.Lock()
+
+    def resource_ids(self, db: Session, names):
+        missing = [name for name in names if name not in self._resource_ids]
+        if missing:
+            rows = db.query(models.Resource.name, models.Resource.id).filter(models.Resource.name.in_(missing)).all()
+            with self._lock:
+                self._resource_ids.update(rows)
+        return {name: self._resource_ids[name] for name in names if name in self._resource_ids}
+
+    def forget_resources(self):
+        # Only names that exist are cached, and resources are never renamed or
+        # deleted, so the ids only need dropping on a full resync.
+        with self._lock:
+            self._resource_ids.clear()
+
+    def masks(self, db: Session, user, resource_names):
+        names = list(dict.fromkeys(resource_names))
+        if isinstance(user, Principal):
+            return {name: user.permissions.get(name, 0) for name in names}
+
+        masks, missing = {}, []
+        for name in names:
+            mask = self.cache.get(user.id, name, user.role)
+            if mask is None:
+                missing.append(name)
+            else:
+                masks[name] = mask
+        if missing:
+            version = self.cache.version(user.id, user.role)
+            ids = self.resource_ids(db, missing)
+            rows = {}
+            if ids:
+                rows = dict(
+                    db.query(models.EffectivePermission.resource_id, models.EffectivePermission.mask)
+                    .filter(models.EffectivePermission.user_id == user.id,
+                            models.EffectivePermission.resource_id.in_(list(ids.values())))
+                    .all()
+                )
+            for name in missing:
+                masks[name] = rows.get(ids.get(name), 0)
+                self.cache.set(user.id, name, masks[name], version=version)
+        return masks
+
+    def granted(self, db: Session, user):
+        # Every resource the user holds any permission on.
+        if isinstance(user, Principal):
+            return dict(user.permissions)
+        return crud.get_permission_masks(db, user.id)
+
+    def evaluate(self, db: Session, user, checks):
+        # checks is a list of (resource_name, action) pairs; never raises on a denial.
+        bits = [action_bit(action) for _, action in checks]
+        masks = self.masks(db, user, [name for name, _ in checks]) if checks else self.granted(db, user)
+        return masks, [masks[name] & bit == bit for (name, _), bit in zip(checks, bits)]
+
+    def enforce(self, db: Session, user, resource_name: str, bit: int, action: str):
+        if self.masks(db, user, [resource_name])[resource_name] & bit != bit:
+            metrics.auth_failures_total.inc("missing_permission", "403")
+            raise HTTPException(status_code=403, detail=f"Missing permission: {action}")
+
+    def has_role(self, user, role: str) -> bool:
+        return (user.role or "").lower() == role
+
+    def enforce_role(self, user, role: str):
+        if not self.has_role(user, role):
+            metrics.auth_failures_total.inc(f"not_{role}", "403")
+            raise HTTPException(status_code=403, detail=f"{role.capitalize()} access required")
+
+
+policy = PolicyEngine()
+invalidation_bus.on("all", lambda _key: policy.forget_resources())
+
+
+def sync_permission_versions(db: Session, cache=permission_cache, chunk_size: int = 500) -> int:
+    # Compares the durable perm_version of every cached user and of every role
+    # with the last poll and drops whatever changed.
+    user_ids = list(cache.cached_user_ids())
+    user_versions = {}
+    for start in range(0, len(user_ids), chunk_size):
+        user_versions.update(
+            db.query(models.User.id, models.User.perm_version)
+            .filter(models.User.id.in_(user_ids[start:start + chunk_size]))
+            .all()
+        )
+    role_versions = dict(db.query(models.Role.name, models.Role.perm_version).all())
+    return cache.reconcile(user_versions, role_versions)
+
+
+# With the process-local invalidation bus, permission changes made on another
+# worker never reach this cache; polling the durable versions bounds how long a
+# revoked permission can keep being honoured here.
+class PermissionVersionSync:
+    def __init__(self, cache=permission_cache):
+        self.cache = cache
+        self._stop = threading.Event()
+        self._thread = None
+        self.syncs = 0
+        self.invalidated = 0
+
+    def sync(self):
+        db = database.SessionLocal()
+        try:
+            self.invalidated += sync_permission_versions(db, self.cache)
+            self.syncs += 1
+        finally:
+            db.close()
+
+    def start(self, interval: float):
+        if interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sync_forever, args=(interval,), name="permission-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _sync_forever(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Failed to poll permission versions")
+
+    def stats(self):
+        return {"running": self._thread is not None, "syncs": self.syncs, "invalidated": self.invalidated}
+
+
+permission_sync = PermissionVersionSync()
+
+
+def start_permission_sync(sync=None, bus=invalidation_bus):
+    sync = permission_sync if sync is None else sync
+    if bus.name != "memory":
+        return
+    logger.warning(
+        "INVALIDATION_BACKEND=memory: permission changes reach the other workers "
+        "only when they poll the database, every %ss (PERMISSION_SYNC_INTERVAL); "
+        "use a shared backend when running more than one worker",
+        config.PERMISSION_SYNC_INTERVAL,
+    )
+    sync.start(config.PERMISSION_SYNC_INTERVAL)
+
+
+def requires(resource_name: str, action: str):
+    # Dependency factory: Depends(requires("create_post", "C")) authenticates the
+    # caller, checks the permission and returns the user. The action is compiled
+    # to its bit here, so a typo fails at import time rather than per request.
+    bit = action_bit(action)
+    action = action.upper()
+
+    @db_endpoint
+    def dependency(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+        policy.enforce(db, current_user, resource_name, bit, action)
+        return current_user
+
+    return dependency
+
+
+def requires_role(role: str):
+    role = role.lower()
+
+    def dependency(current_user: models.User = Depends(get_current_user)):
+        policy.enforce_role(current_user, role)
+        return current_user
+
+    return dependency
+
+
+require_superadmin = requires_role(SUPERADMIN_ROLE)
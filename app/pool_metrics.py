@@ -0,0 +1,52 @@
+import time
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app import metrics
+
+
+class InstrumentedPoolMixin:
+    # Label of this pool's series in rbac_db_pool_checkout_wait_seconds.
+    engine_label = "sync"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_timeouts = 0
+
+    # _do_get is where QueuePool blocks waiting for a free connection, so timing
+    # it measures checkout wait rather than query time.
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.checkout_timeouts += 1
+            raise
+        finally:
+            metrics.db_pool_checkout_wait_seconds.observe(time.perf_counter() - start, self.engine_label)
+
+    def recreate(self):
+        # pre-ping/invalidations may recreate the pool; keep the collected data.
+        pool = super().recreate()
+        pool.checkout_timeouts = self.checkout_timeouts
+        return pool
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    engine_label = "async"
+
+
+def pool_stats(pool):
+    stats = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }
+    if isinstance(pool, InstrumentedPoolMixin):
+        stats["checkout_timeouts"] = pool.checkout_timeouts
+        stats["checkout_wait_seconds"] = metrics.db_pool_checkout_wait_seconds.snapshot(pool.engine_label)
+    return stats
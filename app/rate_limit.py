@@ -0,0 +1,170 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from app import config, metrics
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rule(rule: str):
+    # "5/minute" -> (5, 60). An empty rule or a zero limit disables the check.
+    if not rule or not rule.strip():
+        return None
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(second|minute|hour|day)s?\s*", rule.lower())
+    if match is None:
+        raise ValueError(f"Invalid rate limit rule: {rule!r}")
+    limit = int(match.group(1))
+    return (limit, PERIODS[match.group(2)]) if limit else None
+
+
+def _retry_after(previous: int, current: int, elapsed: float, window: int, limit: int) -> int:
+    # Seconds until one more request fits under the sliding estimate.
+    if current >= limit:
+        # Wait for the next window, then for this window's count (now the previous
+        # one) to decay enough.
+        wait = (window - elapsed) + window * (1 - (limit - 1) / current)
+    else:
+        wait = window * (1 - (limit - current - 1) / previous) - elapsed
+    # Rounding noise (60 * (1 - 1/3) is 40.000000000000004) must not add a second.
+    return max(1, math.ceil(round(wait, 6)))
+
+
+def _evaluate(previous: int, current: int, elapsed: float, window: int, limit: int) -> int:
+    # Sliding window counter: the previous fixed window's count is weighted by how
+    # much of it still overlaps the sliding window. Two integers per key instead
+    # of a timestamp per request. Returns 0 when allowed, else Retry-After.
+    estimate = previous * (1 - elapsed / window) + current
+    if estimate <= limit:
+        return 0
+    return _retry_after(previous, current, elapsed, window, limit)
+
+
+class MemoryRateLimitStore:
+    # Per-process counters in an LRU bounded to max_keys. Evicting a key forgets
+    # its count, so under pressure the least recently seen clients are the ones
+    # that get a fresh allowance.
+    name = "memory"
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: int, window: int, now: float = None) -> int:
+        now = time.time() if now is None else now
+        window_start = int(now // window) * window
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < window_start - window:
+                previous, current = 0, 0
+            elif entry[0] < window_start:
+                previous, current = entry[2], 0
+            else:
+                previous, current = entry[1], entry[2]
+            current += 1
+            self._entries[key] = (window_start, previous, current)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+        return _evaluate(previous, current, now - window_start, window, limit)
+
+    def stats(self):
+        return {"backend": self.name, "keys": len(self._entries), "max_keys": self.max_keys}
+
+
+class RedisRateLimitStore:
+    # Shared counters for multi-worker deployments: one key per client and fixed
+    # window, incremented atomically and expired after two windows.
+    name = "redis"
+
+    def __init__(self, url: str = None, client=None, prefix: str = "rbac:ratelimit:"):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, key: str, limit: int, window: int, now: float = None) -> int:
+        now = time.time() if now is None else now
+        index = int(now // window)
+        current_key = f"{self.prefix}{key}:{index}"
+        pipe = self.client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, window * 2)
+        pipe.get(f"{self.prefix}{key}:{index - 1}")
+        current, _, previous = pipe.execute()
+        return _evaluate(int(previous or 0), int(current), now - index * window, window, limit)
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class RateLimiter:
+    def __init__(self, store):
+        self.store = store
+        self.rejected = 0
+
+    async def check(self, scope: str, kind: str, value: str, rule):
+        # Counts every attempt, rejected ones included, so a client that keeps
+        # hammering stays limited. Raises 429 with Retry-After when over the rule.
+        if rule is None or not config.RATE_LIMIT_ENABLED or not value:
+            return
+        limit, window = rule
+        key = f"{scope}:{kind}:{value}"
+        if self.store.name == "memory":
+            retry_after = self.store.hit(key, limit, window)
+        else:
+            retry_after = await run_in_threadpool(self.store.hit, key, limit, window)
+        if retry_after:
+            self.rejected += 1
+            metrics.rate_limited_total.inc(scope, kind)
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+    def stats(self):
+        return {**self.store.stats(), "enabled": config.RATE_LIMIT_ENABLED, "rejected": self.rejected}
+
+
+def create_limiter():
+    backend = config.RATE_LIMIT_BACKEND
+    if backend == "memory":
+        return RateLimiter(MemoryRateLimitStore(config.RATE_LIMIT_MAX_KEYS))
+    if backend == "redis":
+        return RateLimiter(RedisRateLimitStore(config.RATE_LIMIT_REDIS_URL))
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend!r}")
+
+
+limiter = create_limiter()
+
+
+def client_ip(request: Request) -> str:
+    if config.RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else ""
+
+
+def rate_limit(scope: str, rule: str, per_route: bool = False):
+    # Dependency limiting requests per client IP. With per_route the limit applies
+    # to each route separately (keyed by its path template).
+    parsed = parse_rule(rule)
+
+    async def dependency(request: Request):
+        if parsed is None:
+            return
+        name = scope
+        if per_route:
+            route = request.scope.get("route")
+            name = f"{scope}:{request.method}:{getattr(route, 'path', request.url.path)}"
+        await limiter.check(name, "ip", client_ip(request), parsed)
+
+    return dependency
@@ -0,0 +1,172 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import config
+from app.invalidation import invalidation_bus
+from app.serialization import dumps
+
+
+def _new_stamp():
+    return uuid.uuid4().hex[:16]
+
+
+# Serialized list responses keyed by path + query string, valid while the stamps
+# of the tables they were built from are unchanged. A stamp is a random token
+# replaced on every committed write to the table and broadcast with the new
+# value; with a cross-process bus workers agree on it and ETags stay valid
+# across workers. A worker that has not seen a table written yet uses a private
+# stamp, which can only cost a cache miss. Stamps also expire after ttl seconds:
+# that bounds how long a worker that missed a write (always the case for other
+# workers with the in-memory bus) keeps serving the old page and its 304s.
+class ResponseCache:
+    def __init__(self, maxsize: int = 1000, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._stamps = {}
+        self._tracked = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def track(self, *models):
+        # Only writes to tracked tables are broadcast. Every worker registers the
+        # same tables at import time, whether or not it has served them yet.
+        for model in models:
+            self._tracked.add(model.__table__.name)
+
+    def stamp(self, table: str) -> str:
+        entry = self._stamps.get(table)
+        if entry is None or entry[1] <= time.monotonic():
+            with self._lock:
+                entry = self._stamps.get(table)
+                if entry is None or entry[1] <= time.monotonic():
+                    entry = self._stamps[table] = (_new_stamp(), time.monotonic() + self.ttl)
+        return entry[0]
+
+    def set_stamp(self, table: str, stamp: str):
+        self._stamps[table] = (stamp, time.monotonic() + self.ttl)
+
+    def bump(self, tables):
+        for table in tables:
+            if table in self._tracked:
+                invalidation_bus.publish("table", [table, _new_stamp()])
+
+    def get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, stamp, etag, body, headers):
+        with self._lock:
+            self._entries[key] = (stamp, etag, body, headers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._stamps.clear()
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "tables": sorted(self._tracked),
+        }
+
+
+response_cache = ResponseCache(config.RESPONSE_CACHE_SIZE, config.RESPONSE_CACHE_TTL)
+invalidation_bus.on("table", lambda key: response_cache.set_stamp(*key))
+invalidation_bus.on("all", lambda _key: response_cache.clear())
+
+
+# Writes are noticed at the session level, so every handler (and crud helper)
+# that commits changes to a tracked table invalidates it without extra code.
+def _record_flush(session, flush_context):
+    tables = session.info.setdefault("written_tables", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__table__", None)
+        if table is not None:
+            tables.add(table.name)
+
+
+def _record_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            orm_execute_state.session.info.setdefault("written_tables", set()).add(table.name)
+
+
+def _after_commit(session):
+    tables = session.info.pop("written_tables", None)
+    if tables:
+        response_cache.bump(tables)
+
+
+def _after_rollback(session):
+    session.info.pop("written_tables", None)
+
+
+def install_write_tracking():
+    event.listen(Session, "after_flush", _record_flush)
+    event.listen(Session, "do_orm_execute", _record_statement)
+    event.listen(Session, "after_commit", _after_commit)
+    event.listen(Session, "after_rollback", _after_rollback)
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def cached_list(request: Request, response: Response, model, build):
+    # build() runs the query and returns column dicts (it may set X-Next-Cursor
+    # on response). Permission checks happen in the route's dependencies, before
+    # this is reached. The rows are encoded directly; they are not re-validated
+    # through the route's response model.
+    if not config.RESPONSE_CACHE_ENABLED:
+        body = dumps(build())
+        return Response(content=body, media_type="application/json", headers=_page_headers(response))
+
+    stamp = response_cache.stamp(model.__table__.name)
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    etag = '"' + hashlib.sha1(repr((stamp, key)).encode()).hexdigest() + '"'
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _matches(request.headers.get("if-none-match"), etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=cache_headers)
+
+    entry = response_cache.get(key, stamp)
+    if entry is None:
+        body = dumps(build())
+        headers = _page_headers(response)
+        # The stamp was read before querying, so a write racing with the query
+        # leaves this entry stored under an already outdated stamp.
+        response_cache.put(key, stamp, etag, body, headers)
+    else:
+        _, etag, body, headers = entry
+    return Response(content=body, media_type="application/json", headers={**headers, **cache_headers})
+
+
+def _page_headers(response: Response):
+    return {name: response.headers[name] for name in ("X-Next-Cursor",) if name in response.headers}
@@ -0,0 +1,279 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from app import config, crud, database, models
+from app.invalidation import invalidation_bus
+
+logger = logging.getLogger("app.revocation")
+
+
+class BloomFilter:
+    # Fixed-size bit array with k hash positions derived from one blake2b digest
+    # (double hashing). Sized for `capacity` keys at the given false positive rate.
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "little")
+        b = int.from_bytes(digest[8:], "little") | 1
+        return [(a + i * b) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class DatabaseRevocationBackend:
+    name = "database"
+
+    def add(self, db, jti: str, user_id, expires_at: int):
+        db.execute(
+            crud.dialect_insert(db, models.RevokedToken)
+            .values(jti=jti, user_id=user_id, expires_at=expires_at)
+            .on_conflict_do_nothing(index_elements=["jti"])
+        )
+        db.commit()
+
+    def contains(self, db, jti: str) -> bool:
+        return db.query(models.RevokedToken.jti).filter(models.RevokedToken.jti == jti).first() is not None
+
+    def set_cutoff(self, db, user_id: int, not_before: float):
+        stmt = crud.dialect_insert(db, models.TokenCutoff).values(user_id=user_id, not_before=not_before)
+        db.execute(stmt.on_conflict_do_update(index_elements=["user_id"], set_={"not_before": stmt.excluded.not_before}))
+        db.commit()
+
+    def load(self, now: float):
+        db = database.SessionLocal()
+        try:
+            tokens = db.query(models.RevokedToken.jti, models.RevokedToken.expires_at).filter(
+                models.RevokedToken.expires_at > now
+            ).all()
+            cutoffs = dict(db.query(models.TokenCutoff.user_id, models.TokenCutoff.not_before).all())
+            return tokens, cutoffs
+        finally:
+            db.close()
+
+    def prune(self, db, now: float):
+        db.query(models.RevokedToken).filter(models.RevokedToken.expires_at <= now).delete(synchronize_session=False)
+        db.query(models.TokenCutoff).filter(
+            models.TokenCutoff.not_before <= now - config.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        ).delete(synchronize_session=False)
+        db.commit()
+
+
+class RedisRevocationBackend:
+    # Keys expire with the tokens they describe, so there is nothing to prune.
+    name = "redis"
+
+    def __init__(self, url: str = None, client=None, prefix: str = "rbac:"):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.token_prefix = prefix + "revoked:"
+        self.cutoff_prefix = prefix + "cutoff:"
+
+    def add(self, db, jti: str, user_id, expires_at: int):
+        self.client.set(self.token_prefix + jti, user_id or "", ex=max(1, int(expires_at - time.time())))
+
+    def contains(self, db, jti: str) -> bool:
+        return bool(self.client.exists(self.token_prefix + jti))
+
+    def set_cutoff(self, db, user_id: int, not_before: float):
+        self.client.set(self.cutoff_prefix + str(user_id), not_before, ex=config.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+    def _keys(self, prefix):
+        for key in self.client.scan_iter(match=prefix + "*"):
+            yield key.decode() if isinstance(key, bytes) else key
+
+    def load(self, now: float):
+        tokens = [
+            (key[len(self.token_prefix):], now + max(self.client.ttl(key), 0))
+            for key in self._keys(self.token_prefix)
+        ]
+        cutoffs = {}
+        for key in self._keys(self.cutoff_prefix):
+            value = self.client.get(key)
+            if value is not None:
+                cutoffs[int(key[len(self.cutoff_prefix):])] = float(value)
+        return tokens, cutoffs
+
+    def prune(self, db, now: float):
+        pass
+
+
+# Access token denylist checked on every authenticated request without a DB
+# round trip. Without a Bloom filter every revoked jti is kept in a dict until
+# the token expires; with one, only the filter is kept in memory and the rare
+# positives (revoked tokens plus ~1% false positives) are confirmed against the
+# shared backend. Revocations reach the other workers over the invalidation bus;
+# a backend also lets restarted workers load the current denylist. When the bus
+# is process-local, workers re-read the backend every sync_interval seconds
+# instead, so a revocation is honoured everywhere within that delay.
+class TokenDenylist:
+    def __init__(self, backend=None, bloom_capacity: int = 0, bus=invalidation_bus):
+        self.backend = backend
+        self.bus = bus
+        self.bloom_capacity = bloom_capacity if backend is not None else 0
+        self.bloom = BloomFilter(self.bloom_capacity) if self.bloom_capacity else None
+        self._revoked = {}
+        self._cutoffs = {}
+        self._lock = threading.Lock()
+        self._next_prune = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self.backend_lookups = 0
+        self.rejected = 0
+        self.syncs = 0
+        bus.on("token", self._remember)
+        bus.on("token_cutoff", self._remember_cutoff)
+        bus.on("all", lambda _key: self.load())
+
+    def is_revoked(self, db, claims: dict) -> bool:
+        revoked = self._check(db, claims)
+        if revoked:
+            self.rejected += 1
+        return revoked
+
+    def _check(self, db, claims: dict) -> bool:
+        cutoff = self._cutoffs.get(claims.get("uid"))
+        if cutoff is not None and claims.get("iat", 0) < cutoff:
+            return True
+        jti = claims.get("jti")
+        if jti is None:
+            return False
+        if self.bloom is None:
+            # Expired tokens are rejected by the JWT decode before this point, so
+            # an entry that outlived its token cannot cause a false rejection.
+            return jti in self._revoked
+        if jti not in self.bloom:
+            return False
+        self.backend_lookups += 1
+        return self.backend.contains(db, jti)
+
+    def revoke(self, db, jti: str, user_id, expires_at: int):
+        if self.backend is not None:
+            self.backend.add(db, jti, user_id, expires_at)
+        self.bus.publish("token", [jti, expires_at])
+        self._maybe_prune(db)
+
+    def revoke_user(self, db, user_id: int, not_before: float = None):
+        not_before = time.time() if not_before is None else not_before
+        if self.backend is not None:
+            self.backend.set_cutoff(db, user_id, not_before)
+        self.bus.publish("token_cutoff", [user_id, not_before])
+
+    def _remember(self, key):
+        jti, expires_at = key
+        with self._lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+            else:
+                self._revoked[jti] = expires_at
+
+    def _remember_cutoff(self, key):
+        user_id, not_before = key
+        with self._lock:
+            self._cutoffs[user_id] = max(self._cutoffs.get(user_id, 0), not_before)
+
+    def load(self):
+        if self.backend is None:
+            return
+        tokens, cutoffs = self.backend.load(time.time())
+        with self._lock:
+            if self.bloom is not None:
+                self.bloom = BloomFilter(max(self.bloom_capacity, len(tokens)))
+                for jti, _ in tokens:
+                    self.bloom.add(jti)
+            else:
+                self._revoked = dict(tokens)
+            self._cutoffs = cutoffs
+
+    def start(self, sync_interval: float = 0):
+        self.load()
+        if self.backend is None or sync_interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sync_forever, args=(sync_interval,), name="revocation-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _sync_forever(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.load()
+                self.syncs += 1
+            except Exception:
+                logger.exception("Failed to reload the token denylist")
+
+    def _maybe_prune(self, db):
+        now = time.time()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + config.REVOCATION_PRUNE_INTERVAL
+        oldest_live_token = now - config.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        with self._lock:
+            self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+            self._cutoffs = {uid: nb for uid, nb in self._cutoffs.items() if nb > oldest_live_token}
+        if self.backend is not None:
+            self.backend.prune(db, now)
+            # A Bloom filter cannot forget keys; rebuild it once it is over capacity.
+            if self.bloom is not None and self.bloom.count > self.bloom_capacity:
+                self.load()
+
+    def stats(self):
+        return {
+            "backend": self.backend.name if self.backend is not None else "memory",
+            "revoked": len(self._revoked) if self.bloom is None else self.bloom.count,
+            "cutoffs": len(self._cutoffs),
+            "bloom_bytes": len(self.bloom._bits) if self.bloom is not None else None,
+            "syncs": self.syncs,
+            "backend_lookups": self.backend_lookups,
+            "rejected": self.rejected,
+        }
+
+
+def start_denylist(denylist=None, bus=invalidation_bus):
+    denylist = token_denylist if denylist is None else denylist
+    process_local_bus = bus.name == "memory"
+    if denylist.backend is None and process_local_bus:
+        logger.warning(
+            "REVOCATION_BACKEND=memory with INVALIDATION_BACKEND=memory: logout and token "
+            "revocation only take effect on the worker that handled them; use a shared "
+            "backend when running more than one worker"
+        )
+    # A shared bus delivers revocations as they happen; otherwise poll the backend.
+    denylist.start(config.REVOCATION_SYNC_INTERVAL if process_local_bus else 0)
+
+
+def create_denylist():
+    backend = config.REVOCATION_BACKEND
+    if backend == "memory":
+        return TokenDenylist()
+    if backend == "database":
+        return TokenDenylist(DatabaseRevocationBackend(), config.REVOCATION_BLOOM_CAPACITY)
+    if backend == "redis":
+        return TokenDenylist(
+            RedisRevocationBackend(config.REVOCATION_REDIS_URL), config.REVOCATION_BLOOM_CAPACITY
+        )
+    raise ValueError(f"Unknown REVOCATION_BACKEND: {backend!r}")
+
+
+token_denylist = create_denylist()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class UserCreate(BaseModel):
@@ -23,6 +23,16 @@ class LoginRequest(BaseModel):
     password: str
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class TokenResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+
+
 
 class ResourceAssign(BaseModel):
     user_id: int
@@ -35,6 +45,36 @@ class ResourcePermission(BaseModel):
     permissions: str
 
 
+class RoleTemplate(BaseModel):
+    resources: List[ResourcePermission]
+
+
+class RoleTemplateResponse(BaseModel):
+    name: str
+    resources: List[ResourcePermission]
+
+
+class PermissionCheck(BaseModel):
+    resource_name: str
+    action: str
+
+
+class PermissionCheckRequest(BaseModel):
+    checks: List[PermissionCheck] = []
+    user_id: Optional[int] = None
+
+
+class PermissionCheckResult(PermissionCheck):
+    allowed: bool
+
+
+class PermissionCheckResponse(BaseModel):
+    user_id: int
+    bits: Dict[str, int]
+    resources: Dict[str, int]
+    results: List[PermissionCheckResult]
+
+
 class ApproveUserRequest(BaseModel):
     user_id: int
     role: str
@@ -43,6 +83,15 @@ class ApproveUserRequest(BaseModel):
 
 
 
+class MessageResponse(BaseModel):
+    message: str
+
+
+class BatchCreateResponse(BaseModel):
+    ids: List[int]
+
+
+
 class PostBase(BaseModel):
     title: str
     content: str
@@ -60,6 +109,7 @@ class PostUpdate(BaseModel):
 class PostResponse(PostBase):
     id: int
     owner_id: int
+    comment_count: int = 0
     class Config:
         from_attributes = True
 
@@ -172,3 +222,14 @@ class ReactionResponse(BaseModel):
 
 class ReactionCreate(ReactionPostRequest):
     pass
+
+
+class CommentCountResponse(BaseModel):
+    post_id: int
+    comments: int
+
+
+class ReactionCountResponse(BaseModel):
+    post_id: int
+    total: int
+    reactions: Dict[str, int]
@@ -0,0 +1,28 @@
+import json
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used without it
+    orjson = None
+
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def column_attributes(model):
+    return [getattr(model, column.key) for column in model.__table__.columns]
+
+
+def select_columns(query, model):
+    # Fetch plain column tuples instead of hydrating ORM objects (no identity map,
+    # no instance state); callers turn them into dicts with row._asdict().
+    return query.with_entities(*column_attributes(model))
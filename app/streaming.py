@@ -0,0 +1,38 @@
+from fastapi.responses import StreamingResponse
+from app import config, database
+from app.serialization import dumps, select_columns
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _encode_partition(partition):
+    return b"".join(dumps(dict(row)) + b"\n" for row in partition)
+
+
+def _iter_sync(statement):
+    db = database.SessionLocal()
+    try:
+        result = db.execute(statement).mappings()
+        for partition in result.partitions():
+            yield _encode_partition(partition)
+    finally:
+        db.close()
+
+
+async def _iter_async(statement):
+    async with database.AsyncSessionLocal() as db:
+        result = await db.stream(statement)
+        async for partition in result.mappings().partitions():
+            yield _encode_partition(partition)
+
+
+def stream_rows(query, model, cursor=None):
+    # The request session is closed with its dependency, so the body is produced
+    # from a session owned by the generator. yield_per turns on server-side cursors
+    # and hands rows over in fixed-size partitions, keeping memory flat.
+    statement = select_columns(query, model).statement
+    if cursor is not None:
+        statement = statement.where(model.id > cursor)
+    statement = statement.order_by(model.id).execution_options(yield_per=config.STREAM_BATCH_SIZE)
+    iterator = _iter_async(statement) if config.DB_ASYNC else _iter_sync(statement)
+    return StreamingResponse(iterator, media_type=NDJSON_MEDIA_TYPE)
@@ -1,12 +1,25 @@
+import hashlib
+import hmac
+import secrets
+import time
+import uuid
 from passlib.context import CryptContext
 from jose import jwt
 from datetime import datetime, timedelta
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from app import config, models
+from app import config, models, metrics
+from app.password_pool import password_pool, PasswordPoolFull
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min/max rounds to the configured cost makes verify_and_update flag every
+# hash made with a different cost, so changing BCRYPT_ROUNDS upgrades on login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=config.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=config.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=config.BCRYPT_ROUNDS,
+)
 
 
 SECRET_KEY = config.SECRET_KEY
@@ -21,27 +34,70 @@ def verify_password(plain: str, hashed: str):
     return pwd_context.verify(plain, hashed)
 
 
-def create_access_token(data: dict, expires_minutes: int = 60):
+def _timed(operation: str, fn):
+    def run(*args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            metrics.password_hash_seconds.observe(time.perf_counter() - started, operation)
+    return run
+
+
+async def _run_password_job(operation: str, fn, *args):
+    try:
+        return await password_pool.run(_timed(operation, fn), *args)
+    except PasswordPoolFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many concurrent authentication requests",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def hash_password_async(password: str):
+    return await _run_password_job("hash", hash_password, password)
+
+
+async def hash_password_queued(password: str):
+    # Raises PasswordPoolFull instead of a 503, for callers that can wait.
+    return await password_pool.run(_timed("hash", hash_password), password)
+
+
+async def verify_password_async(plain: str, hashed: str):
+    # Returns (verified, new_hash); new_hash is set when the stored hash was made
+    # with a different cost and should be replaced.
+    return await _run_password_job("verify", pwd_context.verify_and_update, plain, hashed)
+
+
+def create_access_token(data: dict, expires_minutes: int = None):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=expires_minutes)
-    to_encode.update({"exp": expire})
+    expire = datetime.utcnow() + timedelta(minutes=expires_minutes or config.ACCESS_TOKEN_EXPIRE_MINUTES)
+    # "jti" identifies the token for revocation; "iat" is a float so a per-user
+    # cutoff set in the same second as a fresh login does not reject it.
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex, "iat": time.time()})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def new_refresh_token(family_id: str):
+    return f"{family_id}.{secrets.token_urlsafe(32)}"
 
 
-def check_permission(db: Session, user_id: int, resource_name: str, required_perm: str):
-    resource = db.query(models.Resource).filter_by(name=resource_name).first()
-    if not resource:
-        raise HTTPException(status_code=404, detail="Resource not found")
+def hash_refresh_token(token: str):
+    # Refresh tokens carry 256 random bits, so a keyed SHA-256 is enough to keep a
+    # leaked table useless; bcrypt here would bring back the cost refresh avoids.
+    return hmac.new(SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
 
-    user_res = db.query(models.UserResource).filter_by(
-        user_id=user_id,
-        resource_id=resource.id
-    ).first()
 
-    if not user_res or required_perm not in user_res.permissions:
-        raise HTTPException(
-            status_code=403,
-            detail=f"Missing permission: {required_perm}"
-        )
+def user_claims(user: models.User, permissions: dict, version):
+    # Everything get_current_user needs to build a Principal without a users lookup.
+    # "pv" pins the permission version the embedded masks were read at, so the
+    # caller must read it before loading the masks.
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "role": user.role,
+        "active": bool(user.is_active),
+        "perms": permissions,
+        "pv": list(version),
+    }
@@ -0,0 +1,325 @@
+"""Load test / microbenchmark driver for the RBAC API.
+
+Seeds a database, then drives login, token refresh, every resource verb and
+approve-and-assign through an in-process ASGI client. Reports latency
+percentiles, requests/sec and SQL statements per request, and saves the
+results as JSON so runs can be compared:
+
+    python -m benchmarks.run --database-url sqlite:///./bench.db --output before.json
+    python -m benchmarks.run --database-url sqlite:///./bench.db --compare before.json
+
+The target database is written to; point it at a throwaway database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+SUPERADMIN_EMAIL = "bench-admin@example.com"
+BENCH_PASSWORD = "bench-password"
+APPROVAL_TOKEN = "bench-approval-token"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:///./bench.db")
+    parser.add_argument("--users", type=int, default=50, help="regular users to seed")
+    parser.add_argument("--posts", type=int, default=1000, help="posts to seed")
+    parser.add_argument("--comments", type=int, default=5000, help="comments to seed")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4,
+                        help="bcrypt cost used for seeded users and logins")
+    parser.add_argument("--only", action="append", help="run only scenarios containing this text")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    # app.config reads the environment at import time, so this has to run before
+    # anything from the app package is imported.
+    if args.database_url.startswith("sqlite:///"):
+        path = args.database_url[len("sqlite:///"):]
+        if path and path != ":memory:" and os.path.exists(path):
+            os.remove(path)
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ["SUPERADMIN_EMAIL"] = SUPERADMIN_EMAIL
+    os.environ["SUPERADMIN_PASSWORD"] = BENCH_PASSWORD
+    os.environ["SUPERADMIN_APPROVAL_TOKEN"] = APPROVAL_TOKEN
+    # Every benchmark request comes from one client; measure the handlers, not the limiter.
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+
+class QueryCounter:
+    def __init__(self, engines):
+        from sqlalchemy import event
+
+        self.count = 0
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+# Column values for seeded rows of each resource table.
+def seed_row(resource, i, user_id, post_id):
+    return {
+        "create_post": {"title": f"post {i}", "content": "seeded content " * 8, "owner_id": user_id},
+        "comment_post": {"post_id": post_id, "user_id": user_id, "content": f"comment {i}"},
+        "manage_post": {"post_id": post_id, "user_id": user_id, "action": "pin"},
+        "creating_event": {"title": f"event {i}", "description": "seeded", "owner_id": user_id},
+        "creating_poll": {"question": f"poll {i}?", "options": "yes,no", "owner_id": user_id},
+        "reaction_post": {"post_id": post_id, "user_id": user_id, "reaction_type": "like"},
+    }[resource]
+
+
+# Request bodies accepted by the create/update handler of each resource.
+def payload(resource, i, post_id):
+    return {
+        "create_post": {"title": f"bench post {i}", "content": "bench content"},
+        "comment_post": {"post_id": post_id, "content": f"bench comment {i}"},
+        "manage_post": {"post_id": post_id, "action": "feature"},
+        "creating_event": {"title": f"bench event {i}", "description": "bench"},
+        "creating_poll": {"question": f"bench poll {i}?", "options": "a,b"},
+        "reaction_post": {"post_id": post_id, "reaction_type": "love"},
+    }[resource]
+
+
+def seed(args):
+    from sqlalchemy import insert
+    from app import crud, database, models, utils
+
+    models_by_resource = {
+        "create_post": models.Post,
+        "comment_post": models.Comment,
+        "manage_post": models.ManagePost,
+        "creating_event": models.Event,
+        "creating_poll": models.Poll,
+        "reaction_post": models.Reaction,
+    }
+    db = database.SessionLocal()
+    try:
+        hashed = utils.hash_password(BENCH_PASSWORD)
+        user_rows = [{
+            "name": "Bench Admin", "email": SUPERADMIN_EMAIL, "password": hashed,
+            "role": "superadmin", "is_active": True,
+        }] + [{
+            "name": f"Bench User {i}", "email": f"bench-user-{i}@example.com", "password": hashed,
+            "role": "user", "is_active": True,
+        } for i in range(args.users)]
+        db.execute(insert(models.User), user_rows)
+        user_ids = [row.id for row in db.query(models.User.id).filter(models.User.role == "user").order_by(models.User.id)]
+        for user_id in user_ids:
+            crud.upsert_assignments(db, user_id, {name: "CRUD" for name in models_by_resource})
+            crud.refresh_user_permissions(db, user_id)
+        db.commit()
+
+        main_user = user_ids[0]
+        post_rows = [seed_row("create_post", i, user_ids[i % len(user_ids)], None) for i in range(args.posts)]
+        post_ids = list(db.execute(insert(models.Post).returning(models.Post.id), post_rows).scalars())
+        comment_rows = [
+            seed_row("comment_post", i, user_ids[i % len(user_ids)], post_ids[i % len(post_ids)])
+            for i in range(args.comments)
+        ]
+        db.execute(insert(models.Comment), comment_rows)
+
+        # Rows the update and delete scenarios operate on, one per request.
+        targets = {}
+        for resource, model in models_by_resource.items():
+            rows = [seed_row(resource, i, main_user, post_ids[i % len(post_ids)]) for i in range(args.requests * 2)]
+            ids = list(db.execute(insert(model).returning(model.id), rows).scalars())
+            targets[resource] = {"update": ids[:args.requests], "delete": ids[args.requests:]}
+        db.commit()
+        return {"user_ids": user_ids, "post_ids": post_ids, "targets": targets}
+    finally:
+        db.close()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, counter, count, concurrency, make_request):
+    latencies = []
+    statuses = {}
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with slots:
+            start = time.perf_counter()
+            response = await make_request(i)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    queries_before = counter.count
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": count,
+        "elapsed_seconds": round(elapsed, 4),
+        "requests_per_second": round(count / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "queries_per_request": round((counter.count - queries_before) / count, 2),
+        "status_codes": {str(code): n for code, n in sorted(statuses.items())},
+    }
+
+
+def build_scenarios(client, seeded, admin_headers, user_headers, refresh_tokens):
+    post_ids = seeded["post_ids"]
+    scenarios = {}
+
+    def login(i):
+        return client.post("/api/auth/login", json={"email": "bench-user-0@example.com", "password": BENCH_PASSWORD})
+    scenarios["auth.login"] = login
+
+    # Each refresh rotates its token, so every in-flight request takes its own
+    # session from the pool and puts the successor back.
+    async def refresh(i):
+        response = await client.post("/api/auth/refresh", json={"refresh_token": refresh_tokens.pop()})
+        refresh_tokens.append(response.json().get("refresh_token"))
+        return response
+    scenarios["auth.refresh"] = refresh
+
+    for resource, targets in seeded["targets"].items():
+        base = f"/api/resources/{resource}"
+
+        def create(i, resource=resource, base=base):
+            return client.post(base, headers=user_headers, json=payload(resource, i, post_ids[i % len(post_ids)]))
+
+        def read(i, base=base):
+            return client.get(base, headers=user_headers)
+
+        def update(i, resource=resource, base=base, ids=targets["update"]):
+            return client.put(f"{base}/{ids[i % len(ids)]}", headers=user_headers,
+                              json=payload(resource, i, post_ids[i % len(post_ids)]))
+
+        def delete(i, base=base, ids=targets["delete"]):
+            return client.delete(f"{base}/{ids[i % len(ids)]}", headers=user_headers)
+
+        scenarios[f"{resource}.create"] = create
+        scenarios[f"{resource}.read"] = read
+        scenarios[f"{resource}.update"] = update
+        scenarios[f"{resource}.delete"] = delete
+
+    checks = [{"resource_name": name, "action": action} for name in seeded["targets"] for action in "CRUD"]
+
+    def check_all(i):
+        return client.post("/api/resources/permissions/check", headers=user_headers, json={"checks": checks})
+    scenarios["policy.check_batch"] = check_all
+
+    user_ids = seeded["user_ids"]
+
+    def approve_and_assign(i):
+        return client.post("/api/superadmin/approve-and-assign", headers=admin_headers, json={
+            "user_id": user_ids[1 + i % (len(user_ids) - 1)] if len(user_ids) > 1 else user_ids[0],
+            "role": "user",
+            "approval_token": APPROVAL_TOKEN,
+            "resources": [{"resource_name": name, "permissions": "CRUD"} for name in seeded["targets"]],
+        })
+    scenarios["superadmin.approve_and_assign"] = approve_and_assign
+    return scenarios
+
+
+async def drive(args, seeded):
+    import httpx
+    from app import database
+    from app.main import app
+
+    engines = [database.engine]
+    if database.async_engine is not None:
+        engines.append(database.async_engine.sync_engine)
+    counter = QueryCounter(engines)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login(email):
+            response = await client.post("/api/auth/login", json={"email": email, "password": BENCH_PASSWORD})
+            response.raise_for_status()
+            return response.json()
+
+        async def token_headers(email):
+            return {"Authorization": f"Bearer {(await login(email))['access_token']}"}
+
+        admin_headers = await token_headers(SUPERADMIN_EMAIL)
+        user_headers = await token_headers("bench-user-0@example.com")
+        refresh_tokens = [
+            (await login("bench-user-0@example.com"))["refresh_token"] for _ in range(args.concurrency)
+        ]
+        results = {}
+        scenarios = build_scenarios(client, seeded, admin_headers, user_headers, refresh_tokens)
+        for name, make_request in scenarios.items():
+            if args.only and not any(part in name for part in args.only):
+                continue
+            results[name] = await run_scenario(client, counter, args.requests, args.concurrency, make_request)
+            print(format_row(name, results[name]), flush=True)
+    return results
+
+
+def format_row(name, result):
+    return (f"{name:34} {result['requests_per_second']:>9.1f} rps  p50 {result['p50_ms']:>8.2f}ms  "
+            f"p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  "
+            f"{result['queries_per_request']:>5.2f} q/req  {result['status_codes']}")
+
+
+def compare(results, previous_path):
+    with open(previous_path) as handle:
+        previous = json.load(handle)["scenarios"]
+    print(f"\nCompared with {previous_path}:")
+    for name, result in results.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        rps_change = (result["requests_per_second"] - before["requests_per_second"]) / before["requests_per_second"] * 100
+        p95_change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        print(f"{name:34} rps {rps_change:+7.1f}%  p95 {p95_change:+7.1f}%  "
+              f"q/req {before['queries_per_request']:.2f} -> {result['queries_per_request']:.2f}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from app import config, database
+    import sqlalchemy
+
+    database.upgrade_schema()
+    seeded = seed(args)
+    results = asyncio.run(drive(args, seeded))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "database": database.engine.dialect.name,
+            "db_async": config.DB_ASYNC,
+            "auth_stateless": config.AUTH_STATELESS,
+            "args": vars(args),
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Serialization microbenchmark for resource list responses.
+
+Compares the old list path (hydrate ORM objects, validate each one through the
+Pydantic response model, encode with the stdlib json module) with the current
+one (column-only select into dicts, encoded by app.serialization.dumps, which
+uses orjson when it is installed). Reports CPU time per row for each path:
+
+    python -m benchmarks.serialization --rows 10000
+
+The target database is written to; point it at a throwaway database.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:///./bench_serialization.db")
+    parser.add_argument("--rows", type=int, default=10000, help="posts to seed and serialize per run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per path; the best one is reported")
+    return parser.parse_args(argv)
+
+
+def seed(rows):
+    from sqlalchemy import insert
+    from app import database, models
+
+    db = database.SessionLocal()
+    try:
+        db.execute(insert(models.User), [{
+            "name": "Bench User", "email": "bench-serialization@example.com", "password": "x",
+            "role": "user", "is_active": True,
+        }])
+        owner_id = db.query(models.User.id).scalar()
+        db.execute(insert(models.Post), [
+            {"title": f"bench post {i}", "content": "lorem ipsum " * 8, "owner_id": owner_id}
+            for i in range(rows)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def orm_pydantic(db):
+    from pydantic import TypeAdapter
+    from typing import List
+    from app import models, schemas
+
+    # What FastAPI does for response_model=List[PostResponse] on a list of ORM objects.
+    adapter = TypeAdapter(List[schemas.PostResponse])
+    objects = db.query(models.Post).order_by(models.Post.id).all()
+    content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def columns_fast(db):
+    from app import models
+    from app.serialization import dumps, select_columns
+
+    rows = select_columns(db.query(models.Post), models.Post).order_by(models.Post.id).all()
+    return dumps([row._asdict() for row in rows])
+
+
+def measure(fn, repeat):
+    from app import database
+
+    best_cpu = best_wall = None
+    size = 0
+    for _ in range(repeat):
+        db = database.SessionLocal()
+        try:
+            cpu, wall = time.process_time(), time.perf_counter()
+            size = len(fn(db))
+            cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+        finally:
+            db.close()
+        best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+        best_wall = wall if best_wall is None else min(best_wall, wall)
+    return best_cpu, best_wall, size
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.database_url.startswith("sqlite:///"):
+        path = args.database_url[len("sqlite:///"):]
+        if path and path != ":memory:" and os.path.exists(path):
+            os.remove(path)
+    os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from app import database, serialization
+
+    database.upgrade_schema()
+    seed(args.rows)
+
+    encoder = "orjson" if serialization.orjson is not None else "json"
+    print(f"{args.rows} rows, best of {args.repeat}, fast path encoder: {encoder}")
+    results = {}
+    for name, fn in (("orm+pydantic+json", orm_pydantic), ("columns+dumps", columns_fast)):
+        cpu, wall, size = measure(fn, args.repeat)
+        results[name] = cpu
+        print(f"{name:<20} cpu {cpu * 1000:8.1f}ms  wall {wall * 1000:8.1f}ms  "
+              f"{cpu / args.rows * 1e6:6.2f}us/row  {size} bytes")
+    saved = results["orm+pydantic+json"] - results["columns+dumps"]
+    print(f"CPU saved per row: {saved / args.rows * 1e6:.2f}us "
+          f"({results['orm+pydantic+json'] / results['columns+dumps']:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
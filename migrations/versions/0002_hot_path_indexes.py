@@ -0,0 +1,66 @@
+"""hot path indexes and constraints
+
+Adds the unique (user_id, resource_id) constraint that approve-and-assign
+upserts on, an index on user_resources.resource_id, and the (fk, id)
+indexes used by filtered keyset pagination. Duplicate assignments are
+collapsed to the most recent row first so the constraint can be created.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:01
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_user_resources_resource_id", "user_resources", ["resource_id"]),
+    ("ix_posts_owner_id_id", "posts", ["owner_id", "id"]),
+    ("ix_comments_post_id_id", "comments", ["post_id", "id"]),
+    ("ix_comments_user_id_id", "comments", ["user_id", "id"]),
+    ("ix_manage_posts_post_id_id", "manage_posts", ["post_id", "id"]),
+    ("ix_manage_posts_user_id_id", "manage_posts", ["user_id", "id"]),
+    ("ix_events_owner_id_id", "events", ["owner_id", "id"]),
+    ("ix_polls_owner_id_id", "polls", ["owner_id", "id"]),
+    ("ix_reactions_post_id_id", "reactions", ["post_id", "id"]),
+    ("ix_reactions_user_id_id", "reactions", ["user_id", "id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+
+    unique_names = {c["name"] for c in inspector.get_unique_constraints("user_resources")}
+    if "uq_user_resources_user_id_resource_id" not in unique_names:
+        op.execute(
+            "DELETE FROM user_resources WHERE id NOT IN ("
+            "SELECT max_id FROM (SELECT MAX(id) AS max_id FROM user_resources "
+            "GROUP BY user_id, resource_id) AS latest)"
+        )
+        with op.batch_alter_table("user_resources") as batch_op:
+            batch_op.create_unique_constraint(
+                "uq_user_resources_user_id_resource_id", ["user_id", "resource_id"]
+            )
+
+    for name, table, columns in INDEXES:
+        if name not in {index["name"] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    with op.batch_alter_table("user_resources") as batch_op:
+        batch_op.drop_constraint("uq_user_resources_user_id_resource_id", type_="unique")
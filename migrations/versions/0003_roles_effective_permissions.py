@@ -0,0 +1,78 @@
+"""role templates and effective permissions
+
+Adds roles and role_permissions (per-role permission templates) and the
+materialized effective_permissions table that permission checks read.
+Existing user_resources assignments are copied in as per-user overrides.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+PERMISSION_BITS = {"C": 1, "R": 2, "U": 4, "D": 8}
+
+
+def _to_mask(permissions):
+    mask = 0
+    for char in (permissions or "").upper():
+        mask |= PERMISSION_BITS.get(char, 0)
+    return mask
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "roles",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False, unique=True),
+    )
+    op.create_table(
+        "role_permissions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("role_id", sa.Integer(), sa.ForeignKey("roles.id"), nullable=False),
+        sa.Column("resource_id", sa.Integer(), sa.ForeignKey("resources.id"), nullable=False),
+        sa.Column("mask", sa.Integer(), nullable=False),
+        sa.UniqueConstraint("role_id", "resource_id", name="uq_role_permissions_role_id_resource_id"),
+    )
+    op.create_index("ix_role_permissions_resource_id", "role_permissions", ["resource_id"])
+    effective_permissions = op.create_table(
+        "effective_permissions",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("resource_id", sa.Integer(), sa.ForeignKey("resources.id"), primary_key=True),
+        sa.Column("mask", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_effective_permissions_resource_id", "effective_permissions", ["resource_id"])
+    op.create_index("ix_users_role", "users", ["role"])
+
+    rows = op.get_bind().execute(sa.text(
+        "SELECT user_id, resource_id, permissions FROM user_resources "
+        "WHERE user_id IS NOT NULL AND resource_id IS NOT NULL"
+    )).all()
+    if rows:
+        op.bulk_insert(effective_permissions, [
+            {"user_id": user_id, "resource_id": resource_id, "mask": _to_mask(permissions)}
+            for user_id, resource_id, permissions in rows
+        ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_users_role", table_name="users")
+    op.drop_index("ix_effective_permissions_resource_id", table_name="effective_permissions")
+    op.drop_table("effective_permissions")
+    op.drop_index("ix_role_permissions_resource_id", table_name="role_permissions")
+    op.drop_table("role_permissions")
+    op.drop_table("roles")
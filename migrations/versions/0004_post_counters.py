@@ -0,0 +1,51 @@
+"""post comment and reaction counters
+
+Adds posts.comment_count and the post_reaction_counts summary table, both
+kept up to date by the comment/reaction handlers, and backfills them from
+the existing rows.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:03
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("posts") as batch_op:
+        batch_op.add_column(sa.Column("comment_count", sa.Integer(), nullable=False, server_default="0"))
+    op.create_table(
+        "post_reaction_counts",
+        sa.Column("post_id", sa.Integer(), sa.ForeignKey("posts.id"), primary_key=True),
+        sa.Column("reaction_type", sa.String(), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+    )
+
+    op.execute(
+        "UPDATE posts SET comment_count = "
+        "(SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)"
+    )
+    op.execute(
+        "INSERT INTO post_reaction_counts (post_id, reaction_type, count) "
+        "SELECT post_id, reaction_type, COUNT(*) FROM reactions "
+        "WHERE post_id IS NOT NULL GROUP BY post_id, reaction_type"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("post_reaction_counts")
+    with op.batch_alter_table("posts") as batch_op:
+        batch_op.drop_column("comment_count")
@@ -0,0 +1,38 @@
+"""permission versions
+
+Adds users.perm_version and roles.perm_version, bumped in the same
+transaction as permission writes; stateless tokens are only trusted while
+the versions they carry match.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:06
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.add_column(sa.Column("perm_version", sa.Integer(), nullable=False, server_default="0"))
+    with op.batch_alter_table("roles") as batch_op:
+        batch_op.add_column(sa.Column("perm_version", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("roles") as batch_op:
+        batch_op.drop_column("perm_version")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("perm_version")
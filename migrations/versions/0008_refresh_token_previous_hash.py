@@ -0,0 +1,33 @@
+"""refresh token previous hash
+
+Adds refresh_tokens.previous_hash, the hash of the token the current one
+replaced, so only a replay of that token revokes the session.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 00:00:07
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("refresh_tokens") as batch_op:
+        batch_op.add_column(sa.Column("previous_hash", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("refresh_tokens") as batch_op:
+        batch_op.drop_column("previous_hash")
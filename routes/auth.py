@@ -1,48 +1,101 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from app import schemas, crud, utils, database
+from app import schemas, crud, utils, config, metrics
+from app.dependencies import get_db, run_db, get_token_claims, get_current_user
+from app.revocation import token_denylist
+from app.rate_limit import limiter, parse_rule, rate_limit
 
 router = APIRouter()
-
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+login_email_rule = parse_rule(config.RATE_LIMIT_LOGIN_EMAIL)
 
 
 
-@router.post("/signup", response_model=schemas.UserResponse)
-def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    if crud.get_user_by_email(db, user.email):
+@router.post("/signup", response_model=schemas.UserResponse, dependencies=[Depends(rate_limit("signup", config.RATE_LIMIT_SIGNUP_IP))])
+async def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    if await run_db(db, crud.get_user_by_email, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    return crud.create_user(db, user, role=user.role, is_active=False)
+
+    hashed_password = await utils.hash_password_async(user.password)
+    return await run_db(db, crud.create_user, user, role=user.role, is_active=False, hashed_password=hashed_password)
 
 
 
 
-@router.post("/login")
-def login(login_data: schemas.LoginRequest, db: Session = Depends(get_db)):
-    user = crud.get_user_by_email(db, login_data.email)
-    if not user or not utils.verify_password(login_data.password, user.password):
+def access_token_for(db: Session, user, family_id: str):
+    if config.AUTH_STATELESS:
+        claims = crud.build_token_claims(db, user)
+    else:
+        claims = {"sub": user.email, "uid": user.id, "role": user.role}
+    # "fam" ties the access token to its refresh session so logout can end both.
+    claims["fam"] = family_id
+    return utils.create_access_token(claims)
+
+
+@router.post("/login", dependencies=[Depends(rate_limit("login", config.RATE_LIMIT_LOGIN_IP))])
+async def login(login_data: schemas.LoginRequest, db: Session = Depends(get_db)):
+    # Both limits are checked before the bcrypt verify they exist to protect.
+    await limiter.check("login", "email", login_data.email.lower(), login_email_rule)
+    user = await run_db(db, crud.get_user_by_email, login_data.email)
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await utils.verify_password_async(login_data.password, user.password)
+    if not verified:
+        metrics.auth_failures_total.inc("invalid_credentials", "401")
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    if new_hash:
+        await run_db(db, crud.update_password_hash, user.id, new_hash)
+
     if not user.is_active:
+        metrics.auth_failures_total.inc("inactive_account", "403")
         raise HTTPException(status_code=403, detail="Account not approved by Superadmin")
 
-    token = utils.create_access_token({"sub": user.email, "role": user.role})
+    refresh_token, family_id = await run_db(db, crud.issue_refresh_token, user.id)
+    token = await run_db(db, access_token_for, user, family_id)
 
     if user.role == "superadmin":
         return {
             "message": f"Welcome Superadmin {user.name}",
             "access_token": token,
+            "refresh_token": refresh_token,
             "token_type": "bearer"
         }
     else:
         return {
             "message": f"Welcome {user.name}",
             "access_token": token,
+            "refresh_token": refresh_token,
             "token_type": "bearer"
         }
+
+
+@router.post("/refresh", response_model=schemas.TokenResponse, dependencies=[Depends(rate_limit("refresh", config.RATE_LIMIT_REFRESH_IP))])
+async def refresh(data: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    # Reissues a short-lived access token without a password check: one indexed
+    # lookup and an HMAC instead of a bcrypt verify.
+    try:
+        user, refresh_token, family_id = await run_db(db, crud.rotate_refresh_token, data.refresh_token)
+    except crud.InvalidRefreshToken as exc:
+        metrics.auth_failures_total.inc(exc.reason, str(exc.status_code))
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail)
+    token = await run_db(db, access_token_for, user, family_id)
+    return {"access_token": token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+@router.post("/logout", response_model=schemas.MessageResponse)
+async def logout(
+    all: bool = False,
+    db: Session = Depends(get_db),
+    claims: dict = Depends(get_token_claims),
+    current_user=Depends(get_current_user),
+):
+    # all=true also revokes every other token and refresh session of the caller.
+    if all:
+        await run_db(db, token_denylist.revoke_user, current_user.id)
+        await run_db(db, crud.revoke_refresh_tokens, user_id=current_user.id)
+        return {"message": "Logged out"}
+    if claims.get("jti"):
+        await run_db(db, token_denylist.revoke, claims["jti"], current_user.id, claims["exp"])
+    if claims.get("fam"):
+        await run_db(db, crud.revoke_refresh_tokens, family_id=claims["fam"])
+    return {"message": "Logged out"}
@@ -1,45 +1,95 @@
 # app/routes/resources.py
-from fastapi import APIRouter, Depends, HTTPException
+from collections import Counter
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
-from app import models, schemas
-from app.dependencies import get_db, get_current_user
-
-router = APIRouter(tags=["Resources"])
-
-
-
-def check_permission(user: models.User, db: Session, resource_name: str, action: str):
-    assignment = (
-        db.query(models.UserResource)
-        .join(models.Resource)
-        .filter(models.UserResource.user_id == user.id,
-                models.Resource.name == resource_name)
-        .first()
-    )
-    if not assignment or action not in assignment.permissions:
-        raise HTTPException(status_code=403, detail=f"Missing permission: {action}")
+from typing import Annotated, List, Optional
+from pydantic import Field
+from app import models, schemas, crud, config
+from app.dependencies import get_db, get_current_user, db_endpoint
+from app.permission_cache import PERMISSION_BITS
+from app.policy import policy, requires, SUPERADMIN_ROLE
+from app.pagination import PageParams, paginate
+from app.streaming import stream_rows
+from app.response_cache import cached_list, response_cache
+from app.serialization import FastJSONResponse
+from app.rate_limit import rate_limit
+
+router = APIRouter(
+    tags=["Resources"],
+    default_response_class=FastJSONResponse,
+    dependencies=[Depends(rate_limit("resources", config.RATE_LIMIT_RESOURCES, per_route=True))],
+)
+response_cache.track(models.Post, models.Comment, models.ManagePost, models.Event, models.Poll, models.Reaction)
+
+
+def batch_of(item):
+    # Batch endpoints: one permission check, one transaction, chunked inserts.
+    # The size cap is part of the body's validation, so an oversized list is
+    # rejected with a 422 without validating every item first.
+    return Annotated[List[item], Field(max_length=config.MAX_BATCH_SIZE)]
+
+
+
+@router.post("/permissions/check", response_model=schemas.PermissionCheckResponse)
+@db_endpoint
+def check_permissions_in_batch(data: schemas.PermissionCheckRequest, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    # Answers every (resource, action) pair in one round trip. With no checks it
+    # returns every resource the user holds any permission on.
+    pairs = [(check.resource_name, check.action) for check in data.checks]
+    user = current_user
+    if data.user_id is not None and data.user_id != current_user.id:
+        policy.enforce_role(current_user, SUPERADMIN_ROLE)
+        user = db.get(models.User, data.user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+    try:
+        masks, verdicts = policy.evaluate(db, user, pairs)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return {
+        "user_id": user.id,
+        "bits": PERMISSION_BITS,
+        "resources": masks,
+        "results": [
+            {"resource_name": name, "action": action, "allowed": allowed}
+            for (name, action), allowed in zip(pairs, verdicts)
+        ],
+    }
 
 
 
 
 @router.post("/create_post", response_model=schemas.PostResponse)
-def create_post(data: schemas.PostCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "create_post", "C")
+@db_endpoint
+def create_post(data: schemas.PostCreate, db: Session = Depends(get_db), current_user: models.User = Depends(requires("create_post", "C"))):
     post = models.Post(title=data.title, content=data.content, owner_id=current_user.id)
     db.add(post)
     db.commit()
     db.refresh(post)
     return post
 
+@router.post("/create_post/batch", response_model=schemas.BatchCreateResponse)
+@db_endpoint
+def create_posts_batch(data: batch_of(schemas.PostCreate), db: Session = Depends(get_db), current_user: models.User = Depends(requires("create_post", "C"))):
+    rows = [{"title": item.title, "content": item.content, "owner_id": current_user.id} for item in data]
+    ids = crud.bulk_create(db, models.Post, rows)
+    db.commit()
+    return {"ids": ids}
+
 @router.get("/create_post", response_model=List[schemas.PostResponse])
-def read_posts(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "create_post", "R")
-    return db.query(models.Post).all()
+@db_endpoint
+def read_posts(request: Request, response: Response, owner_id: Optional[int] = None, page: PageParams = Depends(), stream: bool = False, db: Session = Depends(get_db), current_user: models.User = Depends(requires("create_post", "R"))):
+    query = db.query(models.Post)
+    if owner_id is not None:
+        query = query.filter(models.Post.owner_id == owner_id)
+    if stream:
+        return stream_rows(query, models.Post, page.cursor)
+    return cached_list(request, response, models.Post, lambda: paginate(query, models.Post, page, response))
 
 @router.put("/create_post/{post_id}", response_model=schemas.PostResponse)
-def update_post(post_id: int, data: schemas.PostUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "create_post", "U")
+@db_endpoint
+def update_post(post_id: int, data: schemas.PostUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(requires("create_post", "U"))):
     post = db.query(models.Post).filter_by(id=post_id).first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
@@ -49,12 +99,13 @@ def update_post(post_id: int, data: schemas.PostUpdate, db: Session = Depends(ge
     db.refresh(post)
     return post
 
-@router.delete("/create_post/{post_id}")
-def delete_post(post_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "create_post", "D")
+@router.delete("/create_post/{post_id}", response_model=schemas.MessageResponse)
+@db_endpoint
+def delete_post(post_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(requires("create_post", "D"))):
     post = db.query(models.Post).filter_by(id=post_id).first()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
+    db.query(models.PostReactionCount).filter_by(post_id=post_id).delete(synchronize_session=False)
     db.delete(post)
     db.commit()
     return {"message": "Post deleted"}
@@ -62,22 +113,47 @@ def delete_post(post_id: int, db: Session = Depends(get_db), current_user: model
 
 
 
-@router.post("/comment_post")
-def create_comment(data: schemas.CommentCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "comment_post", "C")
+@router.post("/comment_post", response_model=schemas.MessageResponse)
+@db_endpoint
+def create_comment(data: schemas.CommentCreate, db: Session = Depends(get_db), current_user: models.User = Depends(requires("comment_post", "C"))):
     comment = models.Comment(post_id=data.post_id, content=data.content, user_id=current_user.id)
     db.add(comment)
+    crud.adjust_comment_count(db, data.post_id, 1)
     db.commit()
     return {"message": "Comment added"}
 
-@router.get("/comment_post")
-def read_comments(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "comment_post", "R")
-    return db.query(models.Comment).all()
+@router.post("/comment_post/batch", response_model=schemas.BatchCreateResponse)
+@db_endpoint
+def create_comments_batch(data: batch_of(schemas.CommentCreate), db: Session = Depends(get_db), current_user: models.User = Depends(requires("comment_post", "C"))):
+    rows = [{"post_id": item.post_id, "content": item.content, "user_id": current_user.id} for item in data]
+    ids = crud.bulk_create(db, models.Comment, rows)
+    crud.adjust_comment_counts(db, Counter(item.post_id for item in data))
+    db.commit()
+    return {"ids": ids}
+
+@router.get("/comment_post", response_model=List[schemas.CommentResponse])
+@db_endpoint
+def read_comments(request: Request, response: Response, post_id: Optional[int] = None, user_id: Optional[int] = None, page: PageParams = Depends(), stream: bool = False, db: Session = Depends(get_db), current_user: models.User = Depends(requires("comment_post", "R"))):
+    query = db.query(models.Comment)
+    if post_id is not None:
+        query = query.filter(models.Comment.post_id == post_id)
+    if user_id is not None:
+        query = query.filter(models.Comment.user_id == user_id)
+    if stream:
+        return stream_rows(query, models.Comment, page.cursor)
+    return cached_list(request, response, models.Comment, lambda: paginate(query, models.Comment, page, response))
+
+@router.get("/comment_post/counts/{post_id}", response_model=schemas.CommentCountResponse)
+@db_endpoint
+def read_comment_count(post_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(requires("comment_post", "R"))):
+    comments = crud.get_comment_count(db, post_id)
+    if comments is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return {"post_id": post_id, "comments": comments}
 
-@router.put("/comment_post/{comment_id}")
-def update_comment(comment_id: int, data: schemas.CommentCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "comment_post", "U")
+@router.put("/comment_post/{comment_id}", response_model=schemas.MessageResponse)
+@db_endpoint
+def update_comment(comment_id: int, data: schemas.CommentCreate, db: Session = Depends(get_db), current_user: models.User = Depends(requires("comment_post", "U"))):
     comment = db.query(models.Comment).filter_by(id=comment_id).first()
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
@@ -85,35 +161,51 @@ def update_comment(comment_id: int, data: schemas.CommentCreate, db: Session = D
     db.commit()
     return {"message": "Comment updated"}
 
-@router.delete("/comment_post/{comment_id}")
-def delete_comment(comment_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "comment_post", "D")
+@router.delete("/comment_post/{comment_id}", response_model=schemas.MessageResponse)
+@db_endpoint
+def delete_comment(comment_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(requires("comment_post", "D"))):
     comment = db.query(models.Comment).filter_by(id=comment_id).first()
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
     db.delete(comment)
+    crud.adjust_comment_count(db, comment.post_id, -1)
     db.commit()
     return {"message": "Comment deleted"}
 
 
 
 
-@router.post("/manage_post")
-def create_manage_post(data: schemas.ManagePostCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "manage_post", "C")
+@router.post("/manage_post", response_model=schemas.MessageResponse)
+@db_endpoint
+def create_manage_post(data: schemas.ManagePostCreate, db: Session = Depends(get_db), current_user: models.User = Depends(requires("manage_post", "C"))):
     manage = models.ManagePost(post_id=data.post_id, action=data.action, user_id=current_user.id)
     db.add(manage)
     db.commit()
     return {"message": "Manage action created"}
 
-@router.get("/manage_post")
-def read_manage_posts(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "manage_post", "R")
-    return db.query(models.ManagePost).all()
-
-@router.put("/manage_post/{manage_id}")
-def update_manage_post(manage_id: int, data: schemas.ManagePostCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "manage_post", "U")
+@router.post("/manage_post/batch", response_model=schemas.BatchCreateResponse)
+@db_endpoint
+def create_manage_posts_batch(data: batch_of(schemas.ManagePostCreate), db: Session = Depends(get_db), current_user: models.User = Depends(requires("manage_post", "C"))):
+    rows = [{"post_id": item.post_id, "action": item.action, "user_id": current_user.id} for item in data]
+    ids = crud.bulk_create(db, models.ManagePost, rows)
+    db.commit()
+    return {"ids": ids}
+
+@router.get("/manage_post", response_model=List[schemas.ManagePostResponse])
+@db_endpoint
+def read_manage_posts(request: Request, response: Response, post_id: Optional[int] = None, user_id: Optional[int] = None, page: PageParams = Depends(), stream: bool = False, db: Session = Depends(get_db), current_user: models.User = Depends(requires("manage_post", "R"))):
+    query = db.query(models.ManagePost)
+    if post_id is not None:
+        query = query.filter(models.ManagePost.post_id == post_id)
+    if user_id is not None:
+        query = query.filter(models.ManagePost.user_id == user_id)
+    if stream:
+        return stream_rows(query, models.ManagePost, page.cursor)
+    return cached_list(request, response, models.ManagePost, lambda: paginate(query, models.ManagePost, page, response))
+
+@router.put("/manage_post/{manage_id}", response_model=schemas.MessageResponse)
+@db_endpoint
+def update_manage_post(manage_id: int, data: schemas.ManagePostCreate, db: Session = Depends(get_db), current_user: models.User = Depends(requires("manage_post", "U"))):
     manage = db.query(models.ManagePost).filter_by(id=manage_id).first()
     if not manage:
         raise HTTPException(status_code=404, detail="ManagePost not found")
@@ -121,9 +213,9 @@ def update_manage_post(manage_id: int, data: schemas.ManagePostCreate, db: Sessi
     db.commit()
     return {"message": "Manage action updated"}
 
-@router.delete("/manage_post/{manage_id}")
-def delete_manage_post(manage_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "manage_post", "D")
+@router.delete("/manage_post/{manage_id}", response_model=schemas.MessageResponse)
+@db_endpoint
+def delete_manage_post(manage_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(requires("manage_post", "D"))):
     manage = db.query(models.ManagePost).filter_by(id=manage_id).first()
     if not manage:
         raise HTTPException(status_code=404, detail="ManagePost not found")
@@ -134,22 +226,35 @@ def delete_manage_post(manage_id: int, db: Session = Depends(get_db), current_us
 
 
 
-@router.post("/creating_event")
-def create_event(data: schemas.EventCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "creating_event", "C")
+@router.post("/creating_event", response_model=schemas.MessageResponse)
+@db_endpoint
+def create_event(data: schemas.EventCreate, db: Session = Depends(get_db), current_user: models.User = Depends(requires("creating_event", "C"))):
     event = models.Event(title=data.title, description=data.description, owner_id=current_user.id)
     db.add(event)
     db.commit()
     return {"message": "Event created"}
 
-@router.get("/creating_event")
-def read_events(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "creating_event", "R")
-    return db.query(models.Event).all()
-
-@router.put("/creating_event/{event_id}")
-def update_event(event_id: int, data: schemas.EventCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "creating_event", "U")
+@router.post("/creating_event/batch", response_model=schemas.BatchCreateResponse)
+@db_endpoint
+def create_events_batch(data: batch_of(schemas.EventCreate), db: Session = Depends(get_db), current_user: models.User = Depends(requires("creating_event", "C"))):
+    rows = [{"title": item.title, "description": item.description, "owner_id": current_user.id} for item in data]
+    ids = crud.bulk_create(db, models.Event, rows)
+    db.commit()
+    return {"ids": ids}
+
+@router.get("/creating_event", response_model=List[schemas.EventResponse])
+@db_endpoint
+def read_events(request: Request, response: Response, owner_id: Optional[int] = None, page: PageParams = Depends(), stream: bool = False, db: Session = Depends(get_db), current_user: models.User = Depends(requires("creating_event", "R"))):
+    query = db.query(models.Event)
+    if owner_id is not None:
+        query = query.filter(models.Event.owner_id == owner_id)
+    if stream:
+        return stream_rows(query, models.Event, page.cursor)
+    return cached_list(request, response, models.Event, lambda: paginate(query, models.Event, page, response))
+
+@router.put("/creating_event/{event_id}", response_model=schemas.MessageResponse)
+@db_endpoint
+def update_event(event_id: int, data: schemas.EventCreate, db: Session = Depends(get_db), current_user: models.User = Depends(requires("creating_event", "U"))):
     event = db.query(models.Event).filter_by(id=event_id).first()
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
@@ -158,9 +263,9 @@ def update_event(event_id: int, data: schemas.EventCreate, db: Session = Depends
     db.commit()
     return {"message": "Event updated"}
 
-@router.delete("/creating_event/{event_id}")
-def delete_event(event_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "creating_event", "D")
+@router.delete("/creating_event/{event_id}", response_model=schemas.MessageResponse)
+@db_endpoint
+def delete_event(event_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(requires("creating_event", "D"))):
     event = db.query(models.Event).filter_by(id=event_id).first()
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
@@ -171,22 +276,35 @@ def delete_event(event_id: int, db: Session = Depends(get_db), current_user: mod
 
 
 
-@router.post("/creating_poll")
-def create_poll(data: schemas.PollCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "creating_poll", "C")
+@router.post("/creating_poll", response_model=schemas.MessageResponse)
+@db_endpoint
+def create_poll(data: schemas.PollCreate, db: Session = Depends(get_db), current_user: models.User = Depends(requires("creating_poll", "C"))):
     poll = models.Poll(question=data.question, options=data.options, owner_id=current_user.id)
     db.add(poll)
     db.commit()
     return {"message": "Poll created"}
 
-@router.get("/creating_poll")
-def read_polls(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "creating_poll", "R")
-    return db.query(models.Poll).all()
-
-@router.put("/creating_poll/{poll_id}")
-def update_poll(poll_id: int, data: schemas.PollCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "creating_poll", "U")
+@router.post("/creating_poll/batch", response_model=schemas.BatchCreateResponse)
+@db_endpoint
+def create_polls_batch(data: batch_of(schemas.PollCreate), db: Session = Depends(get_db), current_user: models.User = Depends(requires("creating_poll", "C"))):
+    rows = [{"question": item.question, "options": item.options, "owner_id": current_user.id} for item in data]
+    ids = crud.bulk_create(db, models.Poll, rows)
+    db.commit()
+    return {"ids": ids}
+
+@router.get("/creating_poll", response_model=List[schemas.PollResponse])
+@db_endpoint
+def read_polls(request: Request, response: Response, owner_id: Optional[int] = None, page: PageParams = Depends(), stream: bool = False, db: Session = Depends(get_db), current_user: models.User = Depends(requires("creating_poll", "R"))):
+    query = db.query(models.Poll)
+    if owner_id is not None:
+        query = query.filter(models.Poll.owner_id == owner_id)
+    if stream:
+        return stream_rows(query, models.Poll, page.cursor)
+    return cached_list(request, response, models.Poll, lambda: paginate(query, models.Poll, page, response))
+
+@router.put("/creating_poll/{poll_id}", response_model=schemas.MessageResponse)
+@db_endpoint
+def update_poll(poll_id: int, data: schemas.PollCreate, db: Session = Depends(get_db), current_user: models.User = Depends(requires("creating_poll", "U"))):
     poll = db.query(models.Poll).filter_by(id=poll_id).first()
     if not poll:
         raise HTTPException(status_code=404, detail="Poll not found")
@@ -195,9 +313,9 @@ def update_poll(poll_id: int, data: schemas.PollCreate, db: Session = Depends(ge
     db.commit()
     return {"message": "Poll updated"}
 
-@router.delete("/creating_poll/{poll_id}")
-def delete_poll(poll_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "creating_poll", "D")
+@router.delete("/creating_poll/{poll_id}", response_model=schemas.MessageResponse)
+@db_endpoint
+def delete_poll(poll_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(requires("creating_poll", "D"))):
     poll = db.query(models.Poll).filter_by(id=poll_id).first()
     if not poll:
         raise HTTPException(status_code=404, detail="Poll not found")
@@ -208,35 +326,64 @@ def delete_poll(poll_id: int, db: Session = Depends(get_db), current_user: model
 
 
 
-@router.post("/reaction_post")
-def create_reaction(data: schemas.ReactionCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "reaction_post", "C")
+@router.post("/reaction_post", response_model=schemas.MessageResponse)
+@db_endpoint
+def create_reaction(data: schemas.ReactionCreate, db: Session = Depends(get_db), current_user: models.User = Depends(requires("reaction_post", "C"))):
     reaction = models.Reaction(post_id=data.post_id, user_id=current_user.id, reaction_type=data.reaction_type)
     db.add(reaction)
+    crud.adjust_reaction_count(db, data.post_id, data.reaction_type, 1)
     db.commit()
     return {"message": "Reaction added"}
 
-@router.get("/reaction_post")
-def read_reactions(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "reaction_post", "R")
-    return db.query(models.Reaction).all()
+@router.post("/reaction_post/batch", response_model=schemas.BatchCreateResponse)
+@db_endpoint
+def create_reactions_batch(data: batch_of(schemas.ReactionCreate), db: Session = Depends(get_db), current_user: models.User = Depends(requires("reaction_post", "C"))):
+    rows = [{"post_id": item.post_id, "reaction_type": item.reaction_type, "user_id": current_user.id} for item in data]
+    ids = crud.bulk_create(db, models.Reaction, rows)
+    crud.add_reaction_counts(db, Counter((item.post_id, item.reaction_type) for item in data))
+    db.commit()
+    return {"ids": ids}
+
+@router.get("/reaction_post", response_model=List[schemas.ReactionResponse])
+@db_endpoint
+def read_reactions(request: Request, response: Response, post_id: Optional[int] = None, user_id: Optional[int] = None, page: PageParams = Depends(), stream: bool = False, db: Session = Depends(get_db), current_user: models.User = Depends(requires("reaction_post", "R"))):
+    query = db.query(models.Reaction)
+    if post_id is not None:
+        query = query.filter(models.Reaction.post_id == post_id)
+    if user_id is not None:
+        query = query.filter(models.Reaction.user_id == user_id)
+    if stream:
+        return stream_rows(query, models.Reaction, page.cursor)
+    return cached_list(request, response, models.Reaction, lambda: paginate(query, models.Reaction, page, response))
+
+@router.get("/reaction_post/counts/{post_id}", response_model=schemas.ReactionCountResponse)
+@db_endpoint
+def read_reaction_counts(post_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(requires("reaction_post", "R"))):
+    reactions = crud.get_reaction_counts(db, post_id)
+    if reactions is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return {"post_id": post_id, "total": sum(reactions.values()), "reactions": reactions}
 
-@router.put("/reaction_post/{reaction_id}")
-def update_reaction(reaction_id: int, data: schemas.ReactionCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "reaction_post", "U")
+@router.put("/reaction_post/{reaction_id}", response_model=schemas.MessageResponse)
+@db_endpoint
+def update_reaction(reaction_id: int, data: schemas.ReactionCreate, db: Session = Depends(get_db), current_user: models.User = Depends(requires("reaction_post", "U"))):
     reaction = db.query(models.Reaction).filter_by(id=reaction_id).first()
     if not reaction:
         raise HTTPException(status_code=404, detail="Reaction not found")
+    if reaction.reaction_type != data.reaction_type:
+        crud.adjust_reaction_count(db, reaction.post_id, reaction.reaction_type, -1)
+        crud.adjust_reaction_count(db, reaction.post_id, data.reaction_type, 1)
     reaction.reaction_type = data.reaction_type
     db.commit()
     return {"message": "Reaction updated"}
 
-@router.delete("/reaction_post/{reaction_id}")
-def delete_reaction(reaction_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    check_permission(current_user, db, "reaction_post", "D")
+@router.delete("/reaction_post/{reaction_id}", response_model=schemas.MessageResponse)
+@db_endpoint
+def delete_reaction(reaction_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(requires("reaction_post", "D"))):
     reaction = db.query(models.Reaction).filter_by(id=reaction_id).first()
     if not reaction:
         raise HTTPException(status_code=404, detail="Reaction not found")
     db.delete(reaction)
+    crud.adjust_reaction_count(db, reaction.post_id, reaction.reaction_type, -1)
     db.commit()
     return {"message": "Reaction deleted"}
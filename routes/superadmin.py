@@ -1,66 +1,136 @@
+import hmac
 import os
-from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
 from sqlalchemy.orm import Session
-from app import models, schemas
-from app.dependencies import get_db, get_current_user
+from app import models, schemas, database, crud, metrics
+from app.dependencies import get_db, db_endpoint
+from app.policy import permission_sync, require_superadmin
+from app.pool_metrics import pool_stats
+from app.password_pool import password_pool
+from app.bulk_import import import_users
+from app.invalidation import invalidation_bus
+from app.response_cache import response_cache
+from app.revocation import token_denylist
+from app.rate_limit import limiter
 
 router = APIRouter(tags=["Super Admin"])
 SUPERADMIN_APPROVAL_TOKEN = os.getenv("SUPERADMIN_APPROVAL_TOKEN")
 
 
+def approval_token_valid(token: Optional[str]) -> bool:
+    # An unset SUPERADMIN_APPROVAL_TOKEN rejects everything rather than matching a
+    # missing token.
+    if not SUPERADMIN_APPROVAL_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), SUPERADMIN_APPROVAL_TOKEN.encode())
+
+
 @router.post("/approve-and-assign")
+@db_endpoint
 def approve_and_assign_user(
     data: schemas.ApproveUserRequest,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: models.User = Depends(require_superadmin)
 ):
     
-    if current_user.role.lower() != "superadmin":
-        raise HTTPException(status_code=403, detail="Only superadmin can approve users")
-
-    
-    if data.approval_token != SUPERADMIN_APPROVAL_TOKEN:
+    if not approval_token_valid(data.approval_token):
+        metrics.auth_failures_total.inc("invalid_approval_token", "403")
         raise HTTPException(status_code=403, detail="Invalid approval token")
 
     
-    user = db.query(models.User).filter(models.User.id == data.user_id).first()
+    user = crud.approve_and_assign(db, data.user_id, data.role, data.resources)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    
-    user.role = data.role
-    user.is_active = True  
-    db.flush()  
-
-    
-    for res in data.resources:
-        resource = db.query(models.Resource).filter_by(name=res.resource_name).first()
-        if not resource:
-            resource = models.Resource(name=res.resource_name)
-            db.add(resource)
-            db.flush()
-
-        existing_assignment = db.query(models.UserResource).filter_by(
-            user_id=user.id,
-            resource_id=resource.id
-        ).first()
-
-        if existing_assignment:
-            existing_assignment.permissions = res.permissions
-        else:
-            new_assignment = models.UserResource(
-                user_id=user.id,
-                resource_id=resource.id,
-                permissions=res.permissions
-            )
-            db.add(new_assignment)
-
-
-    db.commit()
-
     return {
         "message": f"User {user.email} approved, activated, and resources assigned",
         "role": user.role,
         "is_active": user.is_active,
         "resources": [{"name": r.resource_name, "permissions": r.permissions} for r in data.resources]
     }
+
+
+
+@router.get("/roles", response_model=List[schemas.RoleTemplateResponse])
+@db_endpoint
+def list_role_templates(db: Session = Depends(get_db), current_user: models.User = Depends(require_superadmin)):
+    return crud.get_role_templates(db)
+
+
+@router.put("/roles/{role_name}")
+@db_endpoint
+def replace_role_template(
+    role_name: str,
+    data: schemas.RoleTemplate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_superadmin)
+):
+    # Every user with this role picks up the change, except on resources where
+    # they have their own assignment.
+    return crud.set_role_permissions(
+        db, role_name, {res.resource_name: res.permissions for res in data.resources}
+    )
+
+
+@router.post("/users/{user_id}/revoke-tokens", response_model=schemas.MessageResponse)
+@db_endpoint
+def revoke_user_tokens(user_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(require_superadmin)):
+    # Every token issued to the user before now is rejected and their refresh
+    # sessions are ended; new logins still work.
+    if db.get(models.User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    token_denylist.revoke_user(db, user_id)
+    crud.revoke_refresh_tokens(db, user_id=user_id)
+    return {"message": f"Tokens revoked for user {user_id}"}
+
+
+
+@router.get("/metrics/pool")
+def read_pool_metrics(current_user: models.User = Depends(require_superadmin)):
+    metrics = {"sync": pool_stats(database.engine.pool)}
+    if database.async_engine is not None:
+        metrics["async"] = pool_stats(database.async_engine.pool)
+    return metrics
+
+
+@router.get("/metrics/password")
+def read_password_metrics(current_user: models.User = Depends(require_superadmin)):
+    return password_pool.stats()
+
+
+@router.get("/metrics/invalidation")
+def read_invalidation_metrics(current_user: models.User = Depends(require_superadmin)):
+    return {**invalidation_bus.stats(), "permission_sync": permission_sync.stats()}
+
+
+@router.get("/metrics/response-cache")
+def read_response_cache_metrics(current_user: models.User = Depends(require_superadmin)):
+    return response_cache.stats()
+
+
+@router.get("/metrics/revocation")
+def read_revocation_metrics(current_user: models.User = Depends(require_superadmin)):
+    return token_denylist.stats()
+
+
+@router.get("/metrics/rate-limit")
+def read_rate_limit_metrics(current_user: models.User = Depends(require_superadmin)):
+    return limiter.stats()
+
+
+@router.post("/users/import")
+async def import_users_in_bulk(
+    request: Request,
+    activate: bool = False,
+    x_approval_token: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_superadmin)
+):
+    # Body is CSV (Content-Type: text/csv, header row name,email,password,role)
+    # or NDJSON with the same fields; it is consumed as a stream.
+    if activate and not approval_token_valid(x_approval_token):
+        metrics.auth_failures_total.inc("invalid_approval_token", "403")
+        raise HTTPException(status_code=403, detail="Invalid approval token")
+
+    return await import_users(db, request.stream(), request.headers.get("content-type"), activate)
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import uuid
+
+# Configuration is read at import time, so point the app at a throwaway SQLite
+# database before anything under app/ is imported.
+_db_dir = tempfile.mkdtemp(prefix="rbac-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ["DB_ASYNC"] = "false"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["SUPERADMIN_APPROVAL_TOKEN"] = "test-approval-token"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["METRICS_ENABLED"] = "false"
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def schema():
+    from app import database
+
+    database.upgrade_schema()
+
+
+@pytest.fixture
+def db(schema):
+    from app import database
+
+    session = database.SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    from app import crud, schemas
+
+    def make(role: str = "editor", is_active: bool = True, password: str = "pw"):
+        email = f"{uuid.uuid4().hex[:12]}@example.com"
+        user = schemas.UserCreate(name="Test", email=email, password=password, role=role)
+        return crud.create_user(db, user, role=role, is_active=is_active)
+
+    return make
@@ -0,0 +1,24 @@
+import pytest
+
+from routes import superadmin
+
+TOKEN = "test-approval-token"
+
+
+@pytest.mark.parametrize("token", [None, "", "wrong", TOKEN[:-1], TOKEN + "x"])
+def test_missing_empty_or_wrong_token_is_rejected(monkeypatch, token):
+    monkeypatch.setattr(superadmin, "SUPERADMIN_APPROVAL_TOKEN", TOKEN)
+    assert superadmin.approval_token_valid(token) is False
+
+
+def test_correct_token_is_accepted(monkeypatch):
+    monkeypatch.setattr(superadmin, "SUPERADMIN_APPROVAL_TOKEN", TOKEN)
+    assert superadmin.approval_token_valid(TOKEN) is True
+
+
+@pytest.mark.parametrize("configured", [None, ""])
+def test_unset_token_rejects_everything(monkeypatch, configured):
+    monkeypatch.setattr(superadmin, "SUPERADMIN_APPROVAL_TOKEN", configured)
+    assert superadmin.approval_token_valid(None) is False
+    assert superadmin.approval_token_valid("") is False
+    assert superadmin.approval_token_valid("anything") is False
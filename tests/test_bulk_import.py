@@ -0,0 +1,63 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from app import bulk_import, config
+from app.password_pool import PasswordPoolFull, password_pool
+
+
+def ndjson(count):
+    lines = [
+        json.dumps({"name": f"User {n}", "email": f"{uuid.uuid4().hex[:12]}@example.com",
+                    "password": "pw", "role": "editor"})
+        for n in range(count)
+    ]
+
+    async def chunks():
+        yield "\n".join(lines).encode()
+
+    return chunks()
+
+
+@pytest.fixture
+def pool_refusing(monkeypatch):
+    # Makes the shared password pool refuse the given job numbers (1-based), as if
+    # logins had filled it at that moment.
+    def install(refused):
+        calls = []
+        real_run = password_pool.run
+
+        async def run(fn, *args):
+            calls.append(len(calls) + 1)
+            if calls[-1] in refused:
+                raise PasswordPoolFull()
+            return await real_run(fn, *args)
+
+        monkeypatch.setattr(password_pool, "run", run)
+        return calls
+
+    monkeypatch.setattr(config, "BULK_IMPORT_BATCH_SIZE", 2)
+    return install
+
+
+def test_import_waits_for_a_saturated_pool(db, pool_refusing):
+    calls = pool_refusing({3})
+
+    report = asyncio.run(bulk_import.import_users(db, ndjson(4), "application/x-ndjson", False))
+
+    assert report["inserted"] == 4
+    assert report["errors"] == []
+    assert len(calls) == 5
+
+
+def test_import_reports_rows_the_pool_never_accepted(db, pool_refusing, monkeypatch):
+    monkeypatch.setattr(config, "BULK_IMPORT_HASH_WAIT", 0)
+    pool_refusing({3})
+
+    report = asyncio.run(bulk_import.import_users(db, ndjson(4), "application/x-ndjson", False))
+
+    assert report["inserted"] == 3
+    assert report["failed"] == 1
+    assert report["errors"] == [{"row": 3, "error": "Password hashing is saturated; retry this row"}]
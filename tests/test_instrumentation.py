@@ -0,0 +1,41 @@
+import asyncio
+
+from app import instrumentation
+from app.instrumentation import QueryMetricsMiddleware, RequestQueryStats
+
+
+def test_record_keeps_the_slowest_statement():
+    stats = RequestQueryStats()
+    stats.record("SELECT 1", 0.002)
+    stats.record("SELECT 2", 0.010)
+    stats.record("SELECT 3", 0.004)
+
+    assert stats.count == 3
+    assert abs(stats.total_time - 0.016) < 1e-9
+    assert stats.slowest_time == 0.010
+    assert stats.slowest_statement == "SELECT 2"
+
+
+def test_middleware_reports_slowest_statement_time():
+    async def app(scope, receive, send):
+        stats = instrumentation._current_stats.get()
+        stats.record("SELECT fast", 0.001)
+        stats.record("SELECT slow", 0.0125)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": []}
+    asyncio.run(QueryMetricsMiddleware(app)(scope, receive, send))
+
+    headers = dict(sent[0]["headers"])
+    assert headers[b"x-db-query-count"] == b"2"
+    assert headers[b"x-db-slowest-ms"] == b"12.50"
+    assert b"db-slowest;dur=12.50" in headers[b"server-timing"]
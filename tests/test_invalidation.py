@@ -0,0 +1,154 @@
+import json
+import queue
+import threading
+import time
+import uuid
+
+from app.invalidation import MemoryBus, RedisBus, attach_permission_cache
+from app.permission_cache import PermissionCache
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class FakeBroker:
+    # Stand-in for a Redis server's pub/sub: every subscriber of a channel gets
+    # every message, the publisher included, as with real Redis.
+    def __init__(self):
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def publish(self, channel, data):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for pubsub in subscribers:
+            pubsub.messages.put({"type": "message", "channel": channel, "data": data.encode()})
+        return len(subscribers)
+
+
+class FakePubSub:
+    def __init__(self, broker, fail_after=None):
+        self.broker = broker
+        self.messages = queue.Queue()
+        self.channels = []
+        self.fail_after = fail_after
+
+    def subscribe(self, channel):
+        self.channels.append(channel)
+        with self.broker.lock:
+            self.broker.subscribers.setdefault(channel, []).append(self)
+
+    def get_message(self, timeout=0.0):
+        if self.fail_after is not None:
+            if self.fail_after == 0:
+                raise ConnectionError("connection lost")
+            self.fail_after -= 1
+        try:
+            return self.messages.get(timeout=min(timeout, 0.05))
+        except queue.Empty:
+            return None
+
+    def close(self):
+        with self.broker.lock:
+            for channel in self.channels:
+                self.broker.subscribers[channel].remove(self)
+
+
+class FakeRedis:
+    def __init__(self, broker, drops=0):
+        self.broker = broker
+        self.drops = drops
+
+    def publish(self, channel, data):
+        return self.broker.publish(channel, data)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        if self.drops:
+            # The first connections fail shortly after subscribing.
+            self.drops -= 1
+            return FakePubSub(self.broker, fail_after=2)
+        return FakePubSub(self.broker)
+
+
+def subscribers(broker, channel):
+    with broker.lock:
+        return len(broker.subscribers.get(channel, ()))
+
+
+def test_memory_buses_converge():
+    channel = uuid.uuid4().hex
+    cache_a, cache_b = PermissionCache(), PermissionCache()
+    bus_a = attach_permission_cache(MemoryBus(channel), cache_a)
+    bus_b = attach_permission_cache(MemoryBus(channel), cache_b)
+    bus_a.start()
+    bus_b.start()
+    try:
+        bus_a.publish("user", 7)
+        bus_b.publish("role", "editor")
+        assert cache_a.version(7, "editor") == cache_b.version(7, "editor") == (0, 1, 1)
+        assert bus_a.received == bus_b.received == 1
+    finally:
+        bus_a.stop()
+        bus_b.stop()
+
+
+def test_memory_bus_ignores_its_own_messages():
+    bus = MemoryBus(uuid.uuid4().hex)
+    seen = []
+    bus.on("user", seen.append)
+    bus._receive(json.dumps({"origin": bus.origin, "kind": "user", "key": 1}))
+    bus._receive(json.dumps({"origin": "another-worker", "kind": "user", "key": 2}))
+    assert seen == [2]
+    assert bus.received == 1
+
+
+def test_redis_buses_converge_without_echo():
+    broker, channel = FakeBroker(), uuid.uuid4().hex
+    bus_a = RedisBus(channel, client=FakeRedis(broker))
+    bus_b = RedisBus(channel, client=FakeRedis(broker))
+    seen_a, seen_b = [], []
+    bus_a.on("user", seen_a.append)
+    bus_b.on("user", seen_b.append)
+    bus_a.start()
+    bus_b.start()
+    try:
+        assert wait_for(lambda: subscribers(broker, channel) == 2)
+        bus_a.publish("user", 42)
+        assert wait_for(lambda: seen_b == [42])
+        # bus_a applied it locally and then got its own message back from the
+        # broker; the origin id keeps it from applying it twice.
+        time.sleep(0.2)
+        assert seen_a == [42]
+        assert bus_a.received == 0 and bus_b.received == 1
+    finally:
+        bus_a.stop()
+        bus_b.stop()
+
+
+def test_redis_bus_resyncs_after_reconnect():
+    broker, channel = FakeBroker(), uuid.uuid4().hex
+    cache = PermissionCache()
+    bus = attach_permission_cache(RedisBus(channel, client=FakeRedis(broker, drops=1)), cache)
+    cache.set(1, "create_post", 15, cache.version(1))
+    bus.start()
+    try:
+        # Messages published while the listener was down are lost, so the
+        # reconnect drops all cached state instead.
+        assert wait_for(lambda: bus.reconnects == 1)
+        assert cache.get(1, "create_post") is None
+        assert cache.version(1) == (1, 0, 0)
+        assert wait_for(lambda: subscribers(broker, channel) == 1)
+
+        other = RedisBus(channel, client=FakeRedis(broker))
+        seen = []
+        bus.on("user", seen.append)
+        other.publish("user", 5)
+        assert wait_for(lambda: seen == [5])
+    finally:
+        bus.stop()
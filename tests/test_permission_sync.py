@@ -0,0 +1,44 @@
+from app import crud
+from app.permission_cache import PermissionCache
+from app.policy import PolicyEngine, sync_permission_versions
+
+
+def test_other_worker_sees_assignment_after_poll(db, make_user):
+    # The memory bus never reaches another process's cache; a second cache that
+    # is not attached to the bus plays that worker.
+    other = PolicyEngine(cache=PermissionCache(ttl=300))
+    user = make_user()
+    other.masks(db, user, ["create_post"])
+    sync_permission_versions(db, other.cache)
+    assert other.masks(db, user, ["create_post"]) == {"create_post": 0}
+
+    crud.assign_resource(db, user.id, "create_post", "CR")
+    assert other.masks(db, user, ["create_post"]) == {"create_post": 0}
+
+    assert sync_permission_versions(db, other.cache) == 1
+    assert other.masks(db, user, ["create_post"]) == {"create_post": 3}
+
+
+def test_role_template_change_reaches_other_worker_after_poll(db, make_user):
+    other = PolicyEngine(cache=PermissionCache(ttl=300))
+    role = "sync-role"
+    crud.set_role_permissions(db, role, {"create_event": "R"})
+    user = make_user(role=role)
+
+    other.masks(db, user, ["create_event"])
+    sync_permission_versions(db, other.cache)
+    assert other.masks(db, user, ["create_event"]) == {"create_event": 2}
+
+    crud.set_role_permissions(db, role, {"create_event": "CRUD"})
+    assert other.masks(db, user, ["create_event"]) == {"create_event": 2}
+
+    sync_permission_versions(db, other.cache)
+    assert other.masks(db, user, ["create_event"]) == {"create_event": 15}
+
+
+def test_reconcile_invalidates_first_seen_and_changed_versions():
+    cache = PermissionCache()
+    assert cache.reconcile({1: 0}, {"editor": 0}) == 2
+    assert cache.reconcile({1: 0}, {"editor": 0}) == 0
+    assert cache.reconcile({1: 1}, {"editor": 0}) == 1
+    assert cache.reconcile({1: 1}, {"editor": 3}) == 1
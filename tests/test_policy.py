@@ -0,0 +1,112 @@
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import crud
+from app.main import app
+from app.policy import policy, requires
+
+ACTIONS = "CRUD"
+
+
+def allowed(db, user, resource, action):
+    try:
+        requires(resource, action)(db=db, current_user=user)
+    except HTTPException as exc:
+        assert exc.status_code == 403
+        assert exc.detail == f"Missing permission: {action}"
+        return False
+    return True
+
+
+@pytest.mark.parametrize("permissions", ["", "C", "R", "CR", "UD", "CRUD"])
+def test_requires_checks_each_action_bit(db, make_user, permissions):
+    user = make_user()
+    crud.assign_resource(db, user.id, "create_poll", permissions or "-")
+
+    for action in ACTIONS:
+        assert allowed(db, user, "create_poll", action) == (action in permissions)
+
+
+def test_requires_rejects_unknown_actions_at_definition():
+    with pytest.raises(ValueError):
+        requires("create_post", "X")
+
+
+def test_evaluate_returns_masks_and_verdicts(db, make_user):
+    user = make_user()
+    crud.assign_resource(db, user.id, "create_event", "RU")
+
+    masks, verdicts = policy.evaluate(
+        db, user, [("create_event", "R"), ("create_event", "d"), ("create_poll", "R")]
+    )
+
+    assert masks == {"create_event": 6, "create_poll": 0}
+    assert verdicts == [True, False, False]
+
+
+def test_user_override_replaces_the_role_template(db, make_user):
+    role = "policy-role"
+    crud.set_role_permissions(db, role, {"manage_post": "CRUD"})
+    member, overridden = make_user(role=role), make_user(role=role)
+    crud.assign_resource(db, overridden.id, "manage_post", "R")
+
+    assert policy.evaluate(db, member, [])[0] == {"manage_post": 15}
+    assert policy.evaluate(db, overridden, [])[0] == {"manage_post": 2}
+    assert allowed(db, member, "manage_post", "D")
+    assert not allowed(db, overridden, "manage_post", "D")
+
+    # A template change reaches plain members but not the override.
+    crud.set_role_permissions(db, role, {"manage_post": "CR"})
+    assert not allowed(db, member, "manage_post", "D")
+    assert allowed(db, member, "manage_post", "C")
+    assert not allowed(db, overridden, "manage_post", "C")
+    assert allowed(db, overridden, "manage_post", "R")
+
+    # Removing the resource from the template leaves the override in place.
+    crud.set_role_permissions(db, role, {})
+    assert policy.evaluate(db, member, [])[0] == {}
+    assert policy.evaluate(db, overridden, [])[0] == {"manage_post": 2}
+
+
+def login(client, user):
+    response = client.post("/api/auth/login", json={"email": user.email, "password": "pw"})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_batch_permission_check(db, make_user):
+    user = make_user()
+    crud.assign_resource(db, user.id, "create_post", "CR")
+    client = TestClient(app)
+    headers = login(client, user)
+
+    response = client.post("/api/resources/permissions/check", headers=headers, json={"checks": [
+        {"resource_name": "create_post", "action": "C"},
+        {"resource_name": "create_post", "action": "D"},
+        {"resource_name": "create_event", "action": "R"},
+    ]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["user_id"] == user.id
+    assert body["resources"] == {"create_post": 3, "create_event": 0}
+    assert [result["allowed"] for result in body["results"]] == [True, False, False]
+
+    granted = client.post("/api/resources/permissions/check", headers=headers, json={"checks": []})
+    assert granted.json()["resources"] == {"create_post": 3}
+
+    invalid = client.post("/api/resources/permissions/check", headers=headers, json={"checks": [
+        {"resource_name": "create_post", "action": "X"},
+    ]})
+    assert invalid.status_code == 422
+
+
+def test_batch_check_for_another_user_requires_superadmin(db, make_user):
+    user, other = make_user(), make_user()
+    client = TestClient(app)
+
+    response = client.post("/api/resources/permissions/check", headers=login(client, user),
+                           json={"user_id": other.id, "checks": []})
+
+    assert response.status_code == 403
@@ -0,0 +1,79 @@
+import pytest
+
+from app.rate_limit import MemoryRateLimitStore, _evaluate, _retry_after, parse_rule
+
+
+def hits(store, times, key="client", limit=3, window=60):
+    return [store.hit(key, limit, window, now=now) for now in times]
+
+
+def test_requests_up_to_the_limit_are_allowed():
+    store = MemoryRateLimitStore()
+    assert hits(store, [600, 601, 602]) == [0, 0, 0]
+    # The fourth lands in the same window: wait out the window (57 s), then for the
+    # four hits, now the previous window, to decay under the limit (30 s).
+    assert hits(store, [603]) == [87]
+
+
+def test_estimate_exactly_at_the_limit_is_allowed():
+    assert _evaluate(0, 5, 10, 60, 5) == 0
+    assert _evaluate(0, 6, 10, 60, 5) == 70
+    assert _evaluate(10, 0, 30, 60, 5) == 0
+
+
+def test_previous_window_is_weighted_by_its_overlap():
+    # 10 requests last window, half of it still overlapping: 5 + 1 > 5.
+    assert _evaluate(10, 1, 30, 60, 5) == 12
+    # 12 s later the previous window weighs 10 * 18/60 = 3, and 3 + 2 fits.
+    assert _evaluate(10, 2, 42, 60, 5) == 0
+    assert _evaluate(10, 2, 41, 60, 5) > 0
+
+
+def test_window_rollover_carries_the_previous_count():
+    store = MemoryRateLimitStore()
+    assert hits(store, [600, 610, 620]) == [0, 0, 0]
+    # New window starts at 660 with the previous one fully weighted: 3 + 1 > 3.
+    assert hits(store, [660]) == [40]
+    # At 700 the previous window weighs 3 * 20/60 = 1; with the rejected hit at
+    # 660 still counted, 1 + 2 fits.
+    assert hits(store, [700]) == [0]
+
+
+def test_counts_reset_after_a_full_idle_window():
+    store = MemoryRateLimitStore()
+    assert hits(store, [600, 601, 602, 603]) == [0, 0, 0, 87]
+    assert hits(store, [800]) == [0]
+
+
+def test_retry_after_is_honoured():
+    # Waiting the returned number of seconds within the same window is enough.
+    previous, current, elapsed, window, limit = 10, 1, 30, 60, 5
+    wait = _retry_after(previous, current, elapsed, window, limit)
+    assert _evaluate(previous, current + 1, elapsed + wait, window, limit) == 0
+    assert _evaluate(previous, current + 1, elapsed + wait - 1, window, limit) > 0
+
+
+def test_keys_are_limited_independently():
+    store = MemoryRateLimitStore()
+    assert hits(store, [600, 601, 602, 603], key="a") == [0, 0, 0, 87]
+    assert hits(store, [603], key="b") == [0]
+
+
+def test_lru_eviction_forgets_the_oldest_key():
+    store = MemoryRateLimitStore(max_keys=1)
+    hits(store, [600, 601, 602], key="a")
+    hits(store, [602], key="b")
+    assert hits(store, [603], key="a") == [0]
+
+
+@pytest.mark.parametrize("rule, parsed", [
+    ("5/minute", (5, 60)), ("20 / minutes", (20, 60)), ("1/second", (1, 1)),
+    ("100/day", (100, 86400)), ("", None), ("0/minute", None),
+])
+def test_parse_rule(rule, parsed):
+    assert parse_rule(rule) == parsed
+
+
+def test_parse_rule_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_rule("5 per minute")
@@ -0,0 +1,83 @@
+import pytest
+
+from app import crud, models
+
+
+def session_exists(db, family_id):
+    db.expire_all()
+    return db.get(models.RefreshToken, family_id) is not None
+
+
+def test_rotation_returns_a_new_token_for_the_same_session(db, make_user):
+    user = make_user()
+    token, family_id = crud.issue_refresh_token(db, user.id)
+
+    rotated_user, new_token, new_family_id = crud.rotate_refresh_token(db, token)
+
+    assert rotated_user.id == user.id
+    assert new_family_id == family_id
+    assert new_token != token
+    assert new_token.startswith(family_id + ".")
+    # The new token rotates again; the chain continues.
+    _, newer_token, _ = crud.rotate_refresh_token(db, new_token)
+    assert newer_token not in (token, new_token)
+
+
+def test_replaying_the_previous_token_revokes_the_session(db, make_user):
+    user = make_user()
+    token, family_id = crud.issue_refresh_token(db, user.id)
+    _, new_token, _ = crud.rotate_refresh_token(db, token)
+
+    with pytest.raises(crud.InvalidRefreshToken) as exc:
+        crud.rotate_refresh_token(db, token)
+
+    assert exc.value.reason == "refresh_token_reuse"
+    assert not session_exists(db, family_id)
+    with pytest.raises(crud.InvalidRefreshToken):
+        crud.rotate_refresh_token(db, new_token)
+
+
+@pytest.mark.parametrize("secret", ["", "not-the-secret", "x" * 43])
+def test_unknown_secret_for_a_valid_session_does_not_revoke_it(db, make_user, secret):
+    user = make_user()
+    token, family_id = crud.issue_refresh_token(db, user.id)
+
+    with pytest.raises(crud.InvalidRefreshToken) as exc:
+        crud.rotate_refresh_token(db, f"{family_id}.{secret}")
+
+    assert exc.value.reason == "invalid_refresh_token"
+    assert exc.value.status_code == 401
+    assert session_exists(db, family_id)
+    crud.rotate_refresh_token(db, token)
+
+
+def test_malformed_token_is_rejected(db):
+    for token in ("", "no-dot", ".", "unknown-session.secret"):
+        with pytest.raises(crud.InvalidRefreshToken) as exc:
+            crud.rotate_refresh_token(db, token)
+        assert exc.value.reason == "invalid_refresh_token"
+
+
+def test_expired_session_is_rejected(db, make_user):
+    user = make_user()
+    token, family_id = crud.issue_refresh_token(db, user.id)
+    db.query(models.RefreshToken).filter(models.RefreshToken.id == family_id).update({"expires_at": 1})
+    db.commit()
+
+    with pytest.raises(crud.InvalidRefreshToken) as exc:
+        crud.rotate_refresh_token(db, token)
+
+    assert exc.value.reason == "invalid_refresh_token"
+
+
+def test_inactive_user_loses_the_session(db, make_user):
+    user = make_user()
+    token, family_id = crud.issue_refresh_token(db, user.id)
+    user.is_active = False
+    db.commit()
+
+    with pytest.raises(crud.InvalidRefreshToken) as exc:
+        crud.rotate_refresh_token(db, token)
+
+    assert exc.value.status_code == 403
+    assert not session_exists(db, family_id)
@@ -0,0 +1,109 @@
+import time
+import uuid
+
+import pytest
+
+from app import models
+from app.invalidation import MemoryBus
+from app.revocation import DatabaseRevocationBackend, TokenDenylist
+
+
+def new_denylist(backend=None, bloom_capacity=0):
+    # A bus that is never started stands in for one worker: its revocations are
+    # applied locally and reach no other denylist.
+    return TokenDenylist(backend, bloom_capacity, bus=MemoryBus(f"test-{uuid.uuid4().hex}"))
+
+
+def jti():
+    return uuid.uuid4().hex
+
+
+def test_revoke_then_is_revoked():
+    denylist = new_denylist()
+    revoked, other = jti(), jti()
+
+    denylist.revoke(None, revoked, 1, int(time.time()) + 60)
+
+    assert denylist.is_revoked(None, {"jti": revoked, "uid": 1})
+    assert not denylist.is_revoked(None, {"jti": other, "uid": 1})
+    assert not denylist.is_revoked(None, {"uid": 1})
+    assert denylist.rejected == 1
+
+
+def test_revoke_user_rejects_tokens_issued_before_the_cutoff():
+    denylist = new_denylist()
+
+    denylist.revoke_user(None, 7, not_before=1000.0)
+
+    assert denylist.is_revoked(None, {"uid": 7, "iat": 999.5, "jti": jti()})
+    assert not denylist.is_revoked(None, {"uid": 7, "iat": 1000.0, "jti": jti()})
+    assert not denylist.is_revoked(None, {"uid": 7, "iat": 1000.5, "jti": jti()})
+    assert not denylist.is_revoked(None, {"uid": 8, "iat": 999.5, "jti": jti()})
+
+
+def test_revoke_user_keeps_the_latest_cutoff():
+    denylist = new_denylist()
+
+    denylist.revoke_user(None, 7, not_before=2000.0)
+    denylist.revoke_user(None, 7, not_before=1000.0)
+
+    assert denylist.is_revoked(None, {"uid": 7, "iat": 1500.0})
+
+
+def test_bloom_positive_is_confirmed_against_the_backend(db, make_user):
+    user = make_user()
+    denylist = new_denylist(DatabaseRevocationBackend(), bloom_capacity=100)
+    revoked, false_positive = jti(), jti()
+
+    denylist.revoke(db, revoked, user.id, int(time.time()) + 60)
+    # In the filter but not in the backend, as a false positive would be.
+    denylist._remember((false_positive, int(time.time()) + 60))
+
+    assert denylist.is_revoked(db, {"jti": revoked})
+    assert denylist.backend_lookups == 1
+    assert not denylist.is_revoked(db, {"jti": false_positive})
+    assert denylist.backend_lookups == 2
+    assert not denylist.is_revoked(db, {"jti": jti()})
+
+
+def test_prune_rebuilds_the_bloom_filter_over_capacity(db, make_user):
+    user = make_user()
+    denylist = new_denylist(DatabaseRevocationBackend(), bloom_capacity=2)
+    now = int(time.time())
+    expired, live = jti(), [jti(), jti()]
+
+    denylist.revoke(db, expired, user.id, now - 1)
+    denylist.revoke(db, live[0], user.id, now + 60)
+    denylist._next_prune = 0
+    denylist.revoke(db, live[1], user.id, now + 60)
+
+    db.expire_all()
+    assert db.get(models.RevokedToken, expired) is None
+    stored = db.query(models.RevokedToken).filter(models.RevokedToken.expires_at > now).count()
+    assert denylist.bloom.count == stored
+    assert denylist.bloom.capacity >= stored
+    assert all(denylist.is_revoked(db, {"jti": token}) for token in live)
+    assert not denylist.is_revoked(db, {"jti": expired})
+
+
+@pytest.mark.parametrize("bloom_capacity", [0, 100])
+def test_second_denylist_on_the_same_backend_picks_up_revocations(db, make_user, bloom_capacity):
+    user = make_user()
+    first = new_denylist(DatabaseRevocationBackend(), bloom_capacity)
+    second = new_denylist(DatabaseRevocationBackend(), bloom_capacity)
+    second.load()
+    revoked, not_before = jti(), time.time()
+
+    first.revoke(db, revoked, user.id, int(not_before) + 60)
+    first.revoke_user(db, user.id, not_before)
+
+    if not bloom_capacity:
+        # (A Bloom false positive would go to the shared backend and find it.)
+        assert not second.is_revoked(db, {"jti": revoked})
+    assert not second.is_revoked(db, {"uid": user.id, "iat": not_before - 1})
+
+    second.load()
+
+    assert second.is_revoked(db, {"jti": revoked})
+    assert second.is_revoked(db, {"uid": user.id, "iat": not_before - 1})
+    assert not second.is_revoked(db, {"uid": user.id, "iat": not_before + 1})